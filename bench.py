@@ -0,0 +1,472 @@
+"""Load-test and benchmark harness for the SRE API.
+
+Seeds a data set of configurable size with a fixed RNG seed, drives the app
+with a weighted mix of realistic requests from concurrent client threads,
+and reports p50/p99 latency, throughput and RSS per request kind. Results
+are saved as JSON so runs can be compared across changes.
+
+    python bench.py --services 10000 --incidents 100000 --log-lines 100
+    python bench.py --target gunicorn --workers 4 --threads 32 --duration 60
+    python bench.py --compare bench-results/before.json bench-results/after.json
+
+``--target inprocess`` drives the Flask app through its test client in this
+process (no sockets, so it measures the handlers); ``--target gunicorn``
+starts the real server on a local port and drives it over HTTP keep-alive.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_KEY = os.environ.get("API_KEY", "dev-secret")
+SORT_FIELDS = ("name", "replicas", "version", "last_deploy_at", "status")
+SEARCH_WORDS = ("memory", "timeout", "health", "cache", "database")
+
+
+# ----------------------------------------------------------------------
+#  Clients
+# ----------------------------------------------------------------------
+# Clients return ``(status, body, wire_bytes)``: the body decompressed, and
+# the size as sent (compressed, with --gzip).
+class InProcessClient:
+    """Calls the Flask app directly through its test client."""
+
+    def __init__(self, app, headers):
+        self._client = app.test_client()
+        self._headers = headers
+
+    def request(self, method, path, body=None):
+        resp = self._client.open(path, method=method, json=body, headers=self._headers)
+        data = resp.get_data()
+        return resp.status_code, _decode(data, resp.headers.get("Content-Encoding")), len(data)
+
+
+class HttpClient:
+    """One keep-alive HTTP connection to a running server."""
+
+    def __init__(self, host, port, headers):
+        self._host, self._port = host, port
+        self._headers = headers
+        self._conn = None
+
+    def request(self, method, path, body=None):
+        headers = dict(self._headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self._host, self._port, timeout=60)
+            try:
+                self._conn.request(method, path, body=payload, headers=headers)
+                resp = self._conn.getresponse()
+                data = resp.read()
+                return resp.status, _decode(data, resp.getheader("Content-Encoding")), len(data)
+            except (http.client.HTTPException, OSError):
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+
+
+def _decode(data, encoding):
+    return gzip.decompress(data) if encoding == "gzip" else data
+
+
+def _json(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {}
+
+
+# ----------------------------------------------------------------------
+#  Request mix
+# ----------------------------------------------------------------------
+class Context:
+    """What the scenarios need to know about the seeded data set."""
+
+    def __init__(self, client):
+        status, data, _ = client.request("GET", "/v1/summary")
+        if status != 200:
+            raise RuntimeError(f"/v1/summary returned {status}; is the server up?")
+        summary = _json(data)["data"]
+        self.service_count = summary["services"]["total"]
+        self.owners = sorted(summary["services"]["by_owner"])
+        self.statuses = sorted(summary["services"]["by_status"])
+        self.sids = []
+        cursor = None
+        while len(self.sids) < min(self.service_count, 2000):
+            path = "/v1/services?per_page=100&sort=id&include_total=false"
+            _, data, _ = client.request("GET", path + (f"&cursor={cursor}" if cursor else ""))
+            page = _json(data)
+            self.sids += [svc["id"] for svc in page["data"]]
+            cursor = page["meta"].get("next_cursor")
+            if not cursor:
+                break
+
+
+def list_filtered(client, rng, ctx):
+    return [client.request("GET", f"/v1/services?status={rng.choice(ctx.statuses)}"
+                                  f"&owner={rng.choice(ctx.owners)}&per_page=20")]
+
+
+def list_sorted(client, rng, ctx):
+    order = rng.choice(("asc", "desc"))
+    return [client.request("GET", f"/v1/services?sort={rng.choice(SORT_FIELDS)}&order={order}&per_page=50")]
+
+
+def list_search(client, rng, ctx):
+    return [client.request("GET", f"/v1/services?q={rng.choice(SEARCH_WORDS)}&per_page=20")]
+
+
+def deep_page(client, rng, ctx):
+    pages = max(ctx.service_count // 100, 1)
+    page = rng.randint(max(pages // 2, 1), pages)
+    return [client.request("GET", f"/v1/services?page={page}&per_page=100&sort=name")]
+
+
+def cursor_walk(client, rng, ctx):
+    results, cursor = [], None
+    for _ in range(5):
+        path = "/v1/services?per_page=50&sort=last_deploy_at&order=desc"
+        result = client.request("GET", path + (f"&cursor={cursor}" if cursor else ""))
+        results.append(result)
+        cursor = _json(result[1]).get("meta", {}).get("next_cursor")
+        if not cursor:
+            break
+    return results
+
+
+def incidents(client, rng, ctx):
+    severity = rng.choice(("critical", "high", "medium", "low"))
+    return [client.request("GET", f"/v1/incidents?status=open&severity={severity}&per_page=20")]
+
+
+def get_service(client, rng, ctx):
+    return [client.request("GET", f"/v1/services/{rng.choice(ctx.sids)}")]
+
+
+def log_tail(client, rng, ctx):
+    return [client.request("GET", f"/v1/services/{rng.choice(ctx.sids)}/logs?tail=true&limit=100")]
+
+
+def log_search(client, rng, ctx):
+    return [client.request("GET", f"/v1/logs/search?q={rng.choice(SEARCH_WORDS)}&level=ERROR&limit=50")]
+
+
+def summary(client, rng, ctx):
+    return [client.request("GET", "/v1/summary")]
+
+
+def op_burst(client, rng, ctx):
+    return [client.request("POST", f"/v1/services/{sid}/scale", {"replicas": rng.randint(1, 10)})
+            for sid in rng.sample(ctx.sids, min(10, len(ctx.sids)))]
+
+
+def batch(client, rng, ctx):
+    entries = [{"type": "restart", "service_id": sid}
+               for sid in rng.sample(ctx.sids, min(50, len(ctx.sids)))]
+    return [client.request("POST", "/v1/operations/batch",
+                           {"operations": entries, "concurrency": 10, "max_unavailable": 5})]
+
+
+# name -> (weight, scenario)
+MIX = {
+    "list_filtered": (20, list_filtered),
+    "list_sorted": (15, list_sorted),
+    "list_search": (5, list_search),
+    "deep_page": (5, deep_page),
+    "cursor_walk": (5, cursor_walk),
+    "incidents": (10, incidents),
+    "get_service": (15, get_service),
+    "log_tail": (10, log_tail),
+    "log_search": (5, log_search),
+    "summary": (5, summary),
+    "op_burst": (4, op_burst),
+    "batch": (1, batch),
+}
+
+
+# ----------------------------------------------------------------------
+#  Running
+# ----------------------------------------------------------------------
+def run_load(make_client, ctx, args, mix):
+    """Drive ``mix`` from ``args.concurrency`` threads; returns per-scenario samples."""
+    names = list(mix)
+    weights = [mix[name][0] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    start = time.monotonic() + args.warmup
+    deadline = start + args.duration
+
+    def worker(i):
+        client = make_client()
+        rng = random.Random(args.seed * 1000 + i)
+        local = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                results = mix[name][1](client, rng, ctx)
+            except Exception:
+                results = [(599, b"", 0)]
+            elapsed = time.perf_counter() - started
+            if now < start:
+                continue  # warm-up
+            for status, _, _ in results:
+                if status >= 500 or status in (0, 429):
+                    local_errors[name] += 1
+            # Multi-request scenarios report the mean per request.
+            local[name].extend([(elapsed / len(results), size) for _, _, size in results])
+        with lock:
+            for name in names:
+                samples[name].extend(local[name])
+                errors[name] += local_errors[name]
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, errors, duration):
+    report = {}
+    all_latencies = []
+    for name, rows in samples.items():
+        latencies = sorted(latency for latency, _ in rows)
+        all_latencies += latencies
+        report[name] = {
+            "requests": len(rows),
+            "errors": errors[name],
+            "rps": round(len(rows) / duration, 2),
+            "p50_ms": _ms(percentile(latencies, 0.50)),
+            "p90_ms": _ms(percentile(latencies, 0.90)),
+            "p99_ms": _ms(percentile(latencies, 0.99)),
+            "max_ms": _ms(latencies[-1] if latencies else None),
+            "mean_bytes": round(sum(size for _, size in rows) / len(rows)) if rows else None,
+        }
+    all_latencies.sort()
+    report["_all"] = {
+        "requests": len(all_latencies),
+        "errors": sum(errors.values()),
+        "rps": round(len(all_latencies) / duration, 2),
+        "p50_ms": _ms(percentile(all_latencies, 0.50)),
+        "p99_ms": _ms(percentile(all_latencies, 0.99)),
+    }
+    return report
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def rss_bytes(pids):
+    """Current and peak resident set size summed over ``pids`` (Linux /proc)."""
+    current = peak = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as fh:
+                for line in fh:
+                    if line.startswith("VmRSS:"):
+                        current += int(line.split()[1]) * 1024
+                    elif line.startswith("VmHWM:"):
+                        peak += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return {"rss_bytes": current, "peak_rss_bytes": peak}
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            return [int(child) for child in fh.read().split()]
+    except OSError:
+        return []
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_env(args, data_dir):
+    env = {
+        "SEED_SERVICES": str(args.services),
+        "SEED_INCIDENTS": str(args.incidents),
+        "SEED_RANDOM": str(args.seed),
+        "STORE_BACKEND": args.backend,
+    }
+    if args.log_lines is not None:
+        env["SEED_LOG_LINES"] = str(args.log_lines)
+    if args.backend == "sqlite":
+        env["STORE_PATH"] = os.path.join(data_dir, "bench.db")
+    elif args.backend == "journal":
+        env["STORE_PATH"] = os.path.join(data_dir, "journal")
+    return env
+
+
+def bench_inprocess(args, headers, mix):
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(seed_env(args, data_dir))
+        started = time.monotonic()
+        sys.path.insert(0, HERE)
+        import sre_api
+        startup = time.monotonic() - started
+        ctx = Context(InProcessClient(sre_api.app, headers))
+        samples, errors = run_load(lambda: InProcessClient(sre_api.app, headers), ctx, args, mix)
+        return startup, samples, errors, rss_bytes([os.getpid()])
+
+
+def bench_gunicorn(args, headers, mix):
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {**os.environ, **seed_env(args, data_dir)}
+        cmd = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(args.workers), "--threads", str(args.threads),
+               "--timeout", "600", "sre_api:app"]
+        started = time.monotonic()
+        server = subprocess.Popen(cmd, cwd=HERE, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            probe = HttpClient("127.0.0.1", port, headers)
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"gunicorn exited with {server.returncode}")
+                try:
+                    if probe.request("GET", "/v1/healthz")[0] == 200:
+                        break
+                except OSError:
+                    pass
+                time.sleep(0.2)
+            startup = time.monotonic() - started
+            ctx = Context(probe)
+            samples, errors = run_load(lambda: HttpClient("127.0.0.1", port, headers), ctx, args, mix)
+            return startup, samples, errors, rss_bytes([server.pid] + _children(server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"\n{result['target']} @ {result['commit']}: {result['config']['services']} services, "
+          f"startup {result['startup_seconds']:.1f}s, rss {result['memory']['rss_bytes'] / 2**20:.0f} MiB")
+    print(f"{'scenario':<14}{'req':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'bytes':>9}")
+    for name, row in result["scenarios"].items():
+        print(f"{name:<14}{row['requests']:>8}{row['errors']:>6}{row['rps']:>9}"
+              f"{_fmt(row['p50_ms']):>10}{_fmt(row['p99_ms']):>10}{_fmt(row.get('mean_bytes')):>9}")
+
+
+def _fmt(value):
+    return "-" if value is None else str(value)
+
+
+def compare(before_path, after_path):
+    """Print p50/p99/throughput changes between two saved runs."""
+    with open(before_path) as fh:
+        before = json.load(fh)
+    with open(after_path) as fh:
+        after = json.load(fh)
+    print(f"{before['commit']} -> {after['commit']}")
+    print(f"{'scenario':<14}{'p50 ms':>20}{'p99 ms':>20}{'rps':>20}")
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if not old:
+            continue
+        cells = [f"{_fmt(old[k])} -> {_fmt(new[k])}" for k in ("p50_ms", "p99_ms", "rps")]
+        print(f"{name:<14}" + "".join(f"{cell:>20}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--target", choices=("inprocess", "gunicorn"), default="inprocess")
+    parser.add_argument("--services", type=int, default=10000)
+    parser.add_argument("--incidents", type=int, default=10000)
+    parser.add_argument("--log-lines", type=int, default=None,
+                        help="log lines per service (default: the seed's usual handful)")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for data and request mix")
+    parser.add_argument("--backend", choices=("memory", "journal", "sqlite"), default=None,
+                        help="store backend (default: sqlite for multi-worker gunicorn, else memory)")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds first")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads per worker")
+    parser.add_argument("--gzip", action="store_true", help="send Accept-Encoding: gzip")
+    parser.add_argument("--only", help="comma-separated scenarios to run (default: the full mix)")
+    parser.add_argument("--out", help="result file (default: bench-results/<time>-<target>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.backend is None:
+        args.backend = "sqlite" if args.target == "gunicorn" and args.workers > 1 else "memory"
+    mix = MIX
+    if args.only:
+        mix = {name: MIX[name] for name in args.only.split(",")}
+    headers = {"X-API-Key": API_KEY}
+    if args.gzip:
+        headers["Accept-Encoding"] = "gzip"
+
+    run = bench_gunicorn if args.target == "gunicorn" else bench_inprocess
+    startup, samples, errors, memory = run(args, headers, mix)
+    result = {
+        "target": args.target,
+        "commit": git_commit(),
+        "time": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "out")},
+        "startup_seconds": round(startup, 3),
+        "memory": memory,
+        "scenarios": summarize(samples, errors, args.duration),
+    }
+    out = args.out or os.path.join(
+        HERE, "bench-results", f"{datetime.utcnow():%Y%m%dT%H%M%S}-{args.target}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(result, fh, indent=2)
+    print_report(result)
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
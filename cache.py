@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """In-process LRU of serialized response bodies, bounded by total bytes.
+
+    Entries belong to a collection and are only valid for that collection's
+    current version: ``invalidate`` (wired to Versions) drops them the moment
+    the collection changes, and ``put`` refuses bodies built against an
+    outdated version.
+    """
+
+    def __init__(self, max_bytes=16 << 20, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max(max_bytes // 8, 1)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (collection, key) -> body
+        self._by_collection = {}        # collection -> set of keys
+        self._current = {}              # collection -> version
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, collection, version, key):
+        with self._lock:
+            body = None
+            if self._current.get(collection) == version:
+                body = self._entries.get((collection, key))
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((collection, key))
+            self.hits += 1
+            return body
+
+    def put(self, collection, version, key, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            current = self._current.setdefault(collection, version)
+            if current != version:
+                return
+            old = self._entries.pop((collection, key), None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._entries[(collection, key)] = body
+            self._by_collection.setdefault(collection, set()).add(key)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                (old_collection, old_key), old_body = self._entries.popitem(last=False)
+                self._by_collection[old_collection].discard(old_key)
+                self.bytes -= len(old_body)
+                self.evictions += 1
+
+    def invalidate(self, collection, version):
+        """Drop every entry of ``collection``; only ``version`` is valid now."""
+        with self._lock:
+            if version < self._current.get(collection, 0):
+                return  # a newer change already invalidated this collection
+            self._current[collection] = version
+            for key in self._by_collection.pop(collection, ()):
+                body = self._entries.pop((collection, key), None)
+                if body is not None:
+                    self.bytes -= len(body)
+                    self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,114 @@
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+
+# Server preference when the client accepts several at the same quality.
+PREFERENCE = ("zstd", "br", "gzip")
+DEFAULT_LEVELS = {"zstd": 3, "br": 5, "gzip": 6}
+
+
+def _gzip_stream(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip framing
+    return compressor.compress, compressor.flush
+
+
+def _brotli_stream(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.finish
+
+
+def _zstd_stream(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+# encoding -> factory of (compress(chunk), flush()) for one body
+_STREAMS = {"gzip": _gzip_stream}
+if brotli is not None:
+    _STREAMS["br"] = _brotli_stream
+if zstandard is not None:
+    _STREAMS["zstd"] = _zstd_stream
+
+
+class Compression:
+    """``Accept-Encoding`` negotiation plus compression with CPU accounting.
+
+    gzip is always available; brotli and zstd are used when their packages
+    are installed. Bodies under ``min_bytes`` are not worth compressing.
+    CPU time is measured per thread, so it reflects compression work only.
+    """
+
+    def __init__(self, min_bytes=1024, levels=None):
+        self.min_bytes = min_bytes
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+        self.available = tuple(enc for enc in PREFERENCE if enc in _STREAMS)
+        self._lock = threading.Lock()
+        self._stats = {enc: {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+                       for enc in self.available}
+
+    def negotiate(self, accept):
+        """Best available encoding for a werkzeug ``Accept`` header, or None."""
+        best, best_quality = None, 0
+        for enc in self.available:
+            quality = accept.quality(enc)
+            if quality > best_quality:
+                best, best_quality = enc, quality
+        return best
+
+    def compress(self, body, encoding):
+        started = time.thread_time()
+        compress, flush = _STREAMS[encoding](self.levels[encoding])
+        out = compress(body) + flush()
+        self._record(encoding, len(body), len(out), time.thread_time() - started)
+        return out
+
+    def stream(self, chunks, encoding):
+        """Compress an iterable of byte chunks as they are produced."""
+        compress, flush = _STREAMS[encoding](self.levels[encoding])
+        bytes_in = bytes_out = 0
+        cpu = 0.0
+        try:
+            for chunk in chunks:
+                started = time.thread_time()
+                out = compress(chunk)
+                cpu += time.thread_time() - started
+                bytes_in += len(chunk)
+                bytes_out += len(out)
+                if out:
+                    yield out
+            started = time.thread_time()
+            out = flush()
+            cpu += time.thread_time() - started
+            bytes_out += len(out)
+            yield out
+        finally:
+            self._record(encoding, bytes_in, bytes_out, cpu)
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def _record(self, encoding, bytes_in, bytes_out, cpu):
+        with self._lock:
+            stats = self._stats[encoding]
+            stats["responses"] += 1
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["cpu_seconds"] += cpu
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_bytes": self.min_bytes,
+                "levels": {enc: self.levels[enc] for enc in self.available},
+                "encodings": {enc: dict(stats) for enc, stats in self._stats.items()},
+            }
@@ -0,0 +1,407 @@
+import bisect
+from contextlib import contextmanager
+from itertools import islice
+
+from concurrency import RWLock
+
+
+# Fields that /v1/services can be sorted by without a full scan.
+SERVICE_SORT_FIELDS = (
+    "id", "name", "status", "version", "replicas",
+    "desired_replicas", "owner", "last_deploy_at",
+)
+
+# Incident severities from least to most severe; listings order by this
+# rank rather than by the severity string. Unknown severities rank lowest.
+SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+# Below this fraction of the fleet, sorting the candidate ids directly is
+# cheaper than walking a full ordering and skipping non-matches.
+_SORT_CANDIDATES_RATIO = 16
+
+
+class ServiceIndex:
+    """Secondary indexes kept alongside SERVICES.
+
+    * ``by_status`` / ``by_owner``: value -> set of service ids
+    * ``orderings``: field -> sorted list of ``(value, id)`` tuples
+
+    Every service mutation must go through ``add`` / ``reindex`` / ``remove``
+    so the indexes never drift from the records they describe. Queries
+    share a read lock, so concurrent listings only wait for an index update
+    in progress, never for each other.
+
+    Under ``loading()`` (bulk loads) new services are appended to the
+    orderings, which are sorted once when the block ends.
+    """
+
+    def __init__(self, sort_fields=SERVICE_SORT_FIELDS):
+        self.by_status = {}
+        self.by_owner = {}
+        self.orderings = {field: [] for field in sort_fields}
+        self._keys = {}  # sid -> {field: indexed value}
+        self._lock = RWLock()
+        self._loading = 0
+        self._unsorted = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ------------------------------------------------------------------
+    #  Maintenance
+    # ------------------------------------------------------------------
+    def add(self, svc):
+        """Index a new service (or re-index an existing one)."""
+        with self._lock.write():
+            if svc["id"] in self._keys:
+                self._unindex(svc["id"])
+            self._index(svc)
+
+    def reindex(self, svc):
+        """Refresh only the entries whose indexed value changed."""
+        sid = svc["id"]
+        with self._lock.write():
+            keys = self._keys.get(sid)
+            if keys is None:
+                self._index(svc)
+                return
+            for field, old in list(keys.items()):
+                new = svc.get(field, "")
+                if new == old:
+                    continue
+                if field == "status":
+                    _bucket_move(self.by_status, old, new, sid)
+                elif field == "owner":
+                    _bucket_move(self.by_owner, old, new, sid)
+                if field in self.orderings:
+                    self._settle()
+                    ordering = self.orderings[field]
+                    del ordering[bisect.bisect_left(ordering, (old, sid))]
+                    bisect.insort(ordering, (new, sid))
+                keys[field] = new
+
+    @contextmanager
+    def loading(self):
+        """Defer sorting the orderings until the block ends (for bulk loads)."""
+        with self._lock.write():
+            self._loading += 1
+        try:
+            yield
+        finally:
+            with self._lock.write():
+                self._loading -= 1
+                self._settle()
+
+    def _settle(self):
+        if self._unsorted:
+            for ordering in self.orderings.values():
+                ordering.sort()
+            self._unsorted = False
+
+    def remove(self, sid):
+        with self._lock.write():
+            if sid in self._keys:
+                self._unindex(sid)
+
+    def _index(self, svc):
+        sid = svc["id"]
+        keys = {field: svc.get(field, "") for field in self.orderings}
+        keys["status"] = svc["status"]
+        keys["owner"] = svc["owner"]
+        self._keys[sid] = keys
+        self.by_status.setdefault(keys["status"], set()).add(sid)
+        self.by_owner.setdefault(keys["owner"], set()).add(sid)
+        for field, ordering in self.orderings.items():
+            if self._loading:
+                ordering.append((keys[field], sid))
+                self._unsorted = True
+            else:
+                bisect.insort(ordering, (keys[field], sid))
+
+    def _unindex(self, sid):
+        self._settle()
+        keys = self._keys.pop(sid)
+        _bucket_discard(self.by_status, keys["status"], sid)
+        _bucket_discard(self.by_owner, keys["owner"], sid)
+        for field, ordering in self.orderings.items():
+            del ordering[bisect.bisect_left(ordering, (keys[field], sid))]
+
+    # ------------------------------------------------------------------
+    #  Queries
+    # ------------------------------------------------------------------
+    def sort_field(self, sort):
+        """Resolve a requested sort field; unknown fields order by id."""
+        return sort if sort in self.orderings else "id"
+
+    def sort_key(self, sid, sort):
+        """The ``(value, id)`` key of ``sid`` in the ``sort`` ordering."""
+        return (self._keys[sid][self.sort_field(sort)], sid)
+
+    def query(self, statuses=(), owners=(), sort="name", reverse=False,
+              match=None, offset=0, limit=20, after=None, count=True):
+        """Return ``(ids, total)`` for one page of a filtered, sorted listing.
+
+        ``match`` is an optional ``sid -> bool`` predicate for filters that
+        cannot be answered from an index (e.g. substring search).
+
+        ``after`` is a ``(value, id)`` key as returned by ``sort_key``; the
+        page starts right after it (keyset pagination) by binary search
+        instead of skipping ``offset`` rows. ``total`` is ``None`` unless
+        ``count`` is set, since counting is the only part that needs to see
+        every match.
+        """
+        sort = self.sort_field(sort)
+        if self._unsorted:
+            with self._lock.write():
+                self._settle()
+        with self._lock.read():
+            candidates = self._candidates(statuses, owners)
+            ordered = self._iter_sorted(sort, reverse, candidates, after)
+            if match is not None:
+                ordered = (sid for sid in ordered if match(sid))
+            ids = _take(ordered, offset, limit)
+
+            total = None
+            if count and match is not None:
+                pool = self._keys if candidates is None else candidates
+                total = sum(1 for sid in pool if match(sid))
+            elif count:
+                total = len(self._keys if candidates is None else candidates)
+        return ids, total
+
+    def _candidates(self, statuses, owners):
+        """Intersect the status and owner buckets; ``None`` means everything."""
+        sets = []
+        for buckets, values in ((self.by_status, statuses), (self.by_owner, owners)):
+            if values:
+                sets.append(set().union(*(buckets.get(v, ()) for v in values)))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result = result & other
+        return result
+
+    def _iter_sorted(self, sort, reverse, candidates, after=None):
+        keys = self._keys
+
+        def key(sid):
+            return (keys[sid][sort], sid)
+
+        return _iter_ordering(self.orderings[sort], key, reverse, candidates, after)
+
+
+class IncidentIndex:
+    """Secondary indexes kept alongside INCIDENTS.
+
+    * ``by_service``: service id -> set of incident ids
+    * ``by_state``: ``(status, severity)`` -> set of incident ids; a status
+      and/or severity filter is the union of a few of these disjoint buckets
+    * ``ordering``: sorted list of ``(severity rank, created_at, id)``
+      tuples, the listing order (walked from the end, most severe first)
+    * open counts: service id -> ``{severity: count}`` of the incidents not
+      yet resolved, for embedding in service detail
+
+    Like ``ServiceIndex``, every incident change goes through ``add`` /
+    ``reindex`` / ``remove``; acking or resolving only moves an id between
+    buckets, since neither changes its place in ``ordering``.
+    """
+
+    def __init__(self):
+        self.by_service = {}
+        self.by_state = {}
+        self.ordering = []
+        self._keys = {}  # iid -> (service_id, status, severity, sort key)
+        self._open = {}  # service_id -> {severity: unresolved count}
+        self._lock = RWLock()
+        self._loading = 0
+        self._unsorted = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    # ------------------------------------------------------------------
+    #  Maintenance
+    # ------------------------------------------------------------------
+    def add(self, inc):
+        """Index a new incident (or re-index an existing one)."""
+        with self._lock.write():
+            if inc["id"] in self._keys:
+                self._unindex(inc["id"])
+            self._index(inc)
+
+    def reindex(self, inc):
+        """Move the incident between buckets; re-sort only if its key changed."""
+        iid = inc["id"]
+        with self._lock.write():
+            old = self._keys.get(iid)
+            if old is None or old[3] != _incident_sort_key(inc):
+                if old is not None:
+                    self._unindex(iid)
+                self._index(inc)
+                return
+            self._unbucket(iid, old)
+            self._keys[iid] = keys = (inc["service_id"], inc["status"], inc["severity"], old[3])
+            self._bucket(iid, keys)
+
+    def remove(self, iid):
+        with self._lock.write():
+            if iid in self._keys:
+                self._unindex(iid)
+
+    @contextmanager
+    def loading(self):
+        """Defer sorting ``ordering`` until the block ends (for bulk loads)."""
+        with self._lock.write():
+            self._loading += 1
+        try:
+            yield
+        finally:
+            with self._lock.write():
+                self._loading -= 1
+                self._settle()
+
+    def _settle(self):
+        if self._unsorted:
+            self.ordering.sort()
+            self._unsorted = False
+
+    def _index(self, inc):
+        iid = inc["id"]
+        key = _incident_sort_key(inc)
+        self._keys[iid] = keys = (inc["service_id"], inc["status"], inc["severity"], key)
+        self._bucket(iid, keys)
+        if self._loading:
+            self.ordering.append(key)
+            self._unsorted = True
+        else:
+            bisect.insort(self.ordering, key)
+
+    def _unindex(self, iid):
+        self._settle()
+        keys = self._keys.pop(iid)
+        self._unbucket(iid, keys)
+        del self.ordering[bisect.bisect_left(self.ordering, keys[3])]
+
+    def _bucket(self, iid, keys):
+        service_id, status, severity, _ = keys
+        self.by_service.setdefault(service_id, set()).add(iid)
+        self.by_state.setdefault((status, severity), set()).add(iid)
+        if status != "resolved":
+            counts = self._open.setdefault(service_id, {})
+            counts[severity] = counts.get(severity, 0) + 1
+
+    def _unbucket(self, iid, keys):
+        service_id, status, severity, _ = keys
+        _bucket_discard(self.by_service, service_id, iid)
+        _bucket_discard(self.by_state, (status, severity), iid)
+        if status != "resolved":
+            counts = self._open[service_id]
+            counts[severity] -= 1
+            if not counts[severity]:
+                del counts[severity]
+                if not counts:
+                    del self._open[service_id]
+
+    # ------------------------------------------------------------------
+    #  Queries
+    # ------------------------------------------------------------------
+    def sort_key(self, iid):
+        """The ``(rank, created_at, id)`` key of ``iid`` in the listing order."""
+        return self._keys[iid][3]
+
+    def open_counts(self, service_id):
+        """``{"total": n, "by_severity": {...}}`` of a service's unresolved incidents."""
+        with self._lock.read():
+            by_severity = dict(self._open.get(service_id, ()))
+        return {"total": sum(by_severity.values()), "by_severity": by_severity}
+
+    def query(self, statuses=(), severities=(), service_id=None,
+              offset=0, limit=20, after=None, count=True):
+        """Return ``(ids, total)`` for one page, most severe and newest first.
+
+        Filters are answered from the buckets, so the work follows the
+        number of matches, not the number of incidents. ``after`` is a key from
+        ``sort_key`` (keyset pagination); ``total`` is ``None`` unless
+        ``count`` is set.
+        """
+        if self._unsorted:
+            with self._lock.write():
+                self._settle()
+        with self._lock.read():
+            candidates = self._candidates(statuses, severities, service_id)
+            keys = self._keys
+            ordered = _iter_ordering(self.ordering, lambda iid: keys[iid][3],
+                                     True, candidates, after)
+            ids = _take(ordered, offset, limit)
+            total = len(keys if candidates is None else candidates) if count else None
+        return ids, total
+
+    def _candidates(self, statuses, severities, service_id):
+        """The ids matching every filter; ``None`` means everything.
+
+        Only the smaller side (the service's incidents or the matching
+        ``by_state`` buckets) is walked, checking the other filter per id.
+        """
+        if not (statuses or severities):
+            return None if not service_id else self.by_service.get(service_id, set())
+        states = [state for state in self.by_state
+                  if (not statuses or state[0] in statuses)
+                  and (not severities or state[1] in severities)]
+        if service_id:
+            pool = self.by_service.get(service_id, ())
+            keys = self._keys
+            if len(pool) <= sum(len(self.by_state[state]) for state in states):
+                wanted = set(states)
+                return {iid for iid in pool if keys[iid][1:3] in wanted}
+            return {iid for state in states for iid in self.by_state[state]
+                    if keys[iid][0] == service_id}
+        if len(states) == 1:
+            return self.by_state[states[0]]
+        return set().union(*(self.by_state[state] for state in states))
+
+def _incident_sort_key(inc):
+    return (SEVERITY_RANK.get(inc["severity"], 0), inc.get("created_at") or 0, inc["id"])
+
+
+def _iter_ordering(ordering, key, reverse, candidates, after=None):
+    """Ids in ``ordering`` (sorted key tuples ending in the id) after ``after``.
+
+    ``candidates`` restricts the walk; when it is a small share of
+    ``ordering`` the candidates are sorted directly instead.
+    """
+    if candidates is not None and len(candidates) * _SORT_CANDIDATES_RATIO <= len(ordering):
+        if after is not None:
+            candidates = [i for i in candidates
+                          if (key(i) < after if reverse else key(i) > after)]
+        return iter(sorted(candidates, key=key, reverse=reverse))
+
+    if reverse:
+        start = len(ordering) - 1 if after is None else bisect.bisect_left(ordering, after) - 1
+        positions = range(start, -1, -1)
+    else:
+        start = 0 if after is None else bisect.bisect_right(ordering, after)
+        positions = range(start, len(ordering))
+    walk = (ordering[i][-1] for i in positions)
+    if candidates is None:
+        return walk
+    return (i for i in walk if i in candidates)
+
+
+def _bucket_move(buckets, old, new, sid):
+    _bucket_discard(buckets, old, sid)
+    buckets.setdefault(new, set()).add(sid)
+
+
+def _bucket_discard(buckets, value, sid):
+    bucket = buckets.get(value)
+    if bucket is not None:
+        bucket.discard(sid)
+        if not bucket:
+            del buckets[value]
+
+
+def _take(iterator, offset, limit):
+    """Materialize ``limit`` items after skipping ``offset``."""
+    return list(islice(iterator, offset, offset + limit))
@@ -0,0 +1,114 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+from records import Record
+
+
+def _default(obj):
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    return DefaultJSONProvider.default(obj)
+
+
+def dumps(obj):
+    """Compact, key-sorted JSON as bytes, via orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default,
+                                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib encoder takes them
+    return json.dumps(obj, default=_default, sort_keys=True, separators=(",", ":")).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by ``dumps``.
+
+    Output is always compact (never pretty-printed, even under
+    ``debug=True``) and keys stay sorted, so bodies are byte-identical to
+    the stdlib path and safe to cache and ETag.
+    """
+
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+class EncodedRecords:
+    """Encoded JSON per record, reused until the record is replaced.
+
+    Records are never mutated in place (see ``Store``), so an entry is valid
+    exactly as long as it belongs to the same record object; ``discard``
+    just frees the bytes early when a record changes.
+    """
+
+    def __init__(self):
+        self._entries = {}  # (collection, id) -> (record, bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, collection, record):
+        key = (collection, record["id"])
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is record:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        body = dumps(record)
+        self._entries[key] = (record, body)
+        return body
+
+    def array(self, collection, records):
+        return b"[" + b",".join(self.encode(collection, r) for r in records) + b"]"
+
+    def discard(self, collection, key):
+        self._entries.pop((collection, key), None)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def envelope(data, meta):
+    """``{"data": ..., "meta": ...}`` from already-encoded ``data`` bytes."""
+    return b'{"data":' + data + b',"meta":' + dumps(meta) + b"}\n"
+
+
+def iter_envelope(items, meta, chunk_bytes=64 << 10):
+    """Stream ``{"data": [items...], "meta": meta()}`` in chunks.
+
+    ``items`` is any iterable of JSON-able values; they are encoded one by
+    one and flushed every ``chunk_bytes``, so the first bytes go out before
+    the whole array exists. ``meta`` is called after the last item, so it
+    can report what was actually sent.
+    """
+    chunk = [b'{"data":[']
+    size = 0
+    first = True
+    for item in items:
+        encoded = dumps(item)
+        chunk.append(encoded if first else b"," + encoded)
+        first = False
+        size += len(encoded) + 1
+        if size >= chunk_bytes:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    chunk.append(b'],"meta":' + dumps(meta()) + b"}\n")
+    yield b"".join(chunk)
@@ -0,0 +1,246 @@
+import bisect
+import heapq
+import itertools
+import re
+from array import array
+from contextlib import contextmanager
+
+from concurrency import RWLock
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Posting keys pack a line's timestamp above a per-process line counter, so
+# every posting list sorts by time and ties keep append order.
+_GID_BITS = 32
+_GID_MASK = (1 << _GID_BITS) - 1
+
+# Posting entries a compaction pass examines per ``trim`` call.
+_SWEEP_CHUNK = 8192
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric words of ``text``, deduplicated."""
+    return set(_TOKEN.findall(text.lower()))
+
+
+def _key(ts, gid=0):
+    return (ts << _GID_BITS) | (gid & _GID_MASK)
+
+
+def _contains(postings, key):
+    i = bisect.bisect_left(postings, key)
+    return i < len(postings) and postings[i] == key
+
+
+class LogIndex:
+    """Inverted index over log lines: word, level and service -> lines.
+
+    Lines are also listed per ``(service, level)`` stream, so a level
+    filter on some services merges just those streams' time windows.
+
+    Each posting list is an ``array('q')`` of keys sorted by timestamp, so a
+    query binary-searches its time window in the shortest list that
+    constrains it and probes the others, instead of scanning every line.
+
+    Evicted lines are dropped lazily: ``trim`` records each service's oldest
+    live sequence number and queries skip anything older. Once dead entries
+    outnumber live ones a compaction pass starts, and each later ``trim``
+    sweeps the next ``_SWEEP_CHUNK`` posting entries of it, so no single
+    write pays for rebuilding the whole index.
+
+    Lines usually arrive in time order and are appended; a late one is
+    inserted in place, except under ``loading()`` (bulk loads of unordered
+    lines), where it is appended and its list sorted once afterwards.
+    """
+
+    def __init__(self):
+        self._lock = RWLock()
+        self._gids = itertools.count()
+        self._lines = {}       # key -> (sid, seq)
+        self._first = {}       # sid -> oldest live seq
+        self._all = array("q")
+        self._by_token = {}    # token -> array of keys
+        self._by_level = {}    # level code -> array of keys
+        self._by_service = {}  # sid -> array of keys
+        self._by_stream = {}   # (sid, level code) -> array of keys
+        self._dead = 0
+        self._sweep = None     # lists left in the current compaction pass
+        self._sweeping = None  # (lists, name, position) being swept
+        self._loading = 0
+        self._unsorted = {}    # id -> posting list appended to out of order
+
+    def __len__(self):
+        return len(self._lines) - self._dead
+
+    def add(self, sid, seq, ts, level, message):
+        key = _key(ts, next(self._gids))
+        with self._lock.write():
+            self._lines[key] = (sid, seq)
+            lists = [self._all,
+                     self._by_level.setdefault(level, array("q")),
+                     self._by_service.setdefault(sid, array("q")),
+                     self._by_stream.setdefault((sid, level), array("q"))]
+            lists += [self._by_token.setdefault(token, array("q")) for token in tokenize(message)]
+            for postings in lists:
+                if not postings or key >= postings[-1]:
+                    postings.append(key)
+                elif self._loading:
+                    postings.append(key)
+                    self._unsorted[id(postings)] = postings
+                else:
+                    bisect.insort(postings, key)
+
+    @contextmanager
+    def loading(self):
+        """Defer ordering posting lists until the block ends (for bulk loads)."""
+        with self._lock.write():
+            self._loading += 1
+        try:
+            yield
+        finally:
+            with self._lock.write():
+                self._loading -= 1
+                self._settle()
+
+    def _settle(self):
+        for postings in self._unsorted.values():
+            postings[:] = array("q", sorted(postings))
+        self._unsorted.clear()
+
+    def trim(self, sid, first_seq, evicted):
+        """Lines of ``sid`` below ``first_seq`` are gone (``evicted`` of them)."""
+        with self._lock.write():
+            self._first[sid] = first_seq
+            self._dead += evicted
+            if self._sweep is None and self._dead > max(len(self._lines) - self._dead, 1024):
+                # One pass over every posting list, ``_all`` (which also
+                # drops dead lines from ``_lines``) last.
+                self._sweep = itertools.chain(
+                    *(zip(itertools.repeat(lists), list(lists))
+                      for lists in (self._by_token, self._by_level, self._by_service, self._by_stream)),
+                    [(None, None)],
+                )
+            if self._sweep is not None:
+                self._compact(_SWEEP_CHUNK)
+
+    def _compact(self, budget):
+        """Drop dead keys from the next ``budget`` posting entries of the pass."""
+        get_line, get_first = self._lines.get, self._first.get
+        while budget > 0:
+            if self._sweeping is None:
+                lists, name = next(self._sweep, (False, None))
+                if lists is False:
+                    self._sweep = None
+                    return
+                self._sweeping = (lists, name, 0)
+            lists, name, pos = self._sweeping
+            postings = self._all if lists is None else lists.get(name)
+            if postings is None:
+                self._sweeping = None
+                continue
+            end = min(pos + budget, len(postings))
+            chunk = postings[pos:end]
+            kept = array("q", [key for key in chunk if (line := get_line(key)) is not None
+                               and line[1] >= get_first(line[0], 0)])
+            if lists is None:
+                for key in set(chunk).difference(kept):
+                    del self._lines[key]
+                self._dead -= len(chunk) - len(kept)
+            postings[pos:end] = kept
+            budget -= max(end - pos, 1)
+            pos += len(kept)
+            if pos < len(postings):
+                self._sweeping = (lists, name, pos)
+                continue
+            self._sweeping = None
+            if not postings and lists is not None:
+                del lists[name]
+
+    def search(self, tokens=(), levels=(), services=(), since=None, until=None,
+               after=None, limit=100, accept=None, reverse=False):
+        """Up to ``limit`` matches as ``(ts, sid, seq)``, oldest first.
+
+        Every token must match; ``levels`` and ``services`` match any of
+        their values. ``since`` / ``until`` bound the timestamp (inclusive /
+        exclusive). ``after`` is the last ``(ts, sid, seq)`` of a previous
+        page. Results are ordered by ``(ts, sid, seq)``, which every process
+        agrees on, so cursors work across workers. ``accept(sid, seq)`` can
+        reject candidates the index can't rule out (e.g. phrase matches).
+
+        The posting lists driving the query are each binary-searched to the
+        window and k-way merged, so without tokens a page costs
+        O(lists * log n + limit) however many lines the window spans.
+        ``reverse`` walks newest first (``after`` then bounds from above).
+        """
+        if self._unsorted:
+            with self._lock.write():
+                self._settle()
+        with self._lock.read():
+            constraints = [[self._by_token.get(token, array("q"))] for token in tokens]
+            if levels and services:
+                constraints.append([self._by_stream[(s, lv)] for s in services for lv in levels
+                                    if (s, lv) in self._by_stream])
+            elif levels:
+                constraints.append([self._by_level[lv] for lv in levels if lv in self._by_level])
+            elif services:
+                constraints.append([self._by_service[s] for s in services if s in self._by_service])
+            if not constraints:
+                constraints.append([self._all])
+            constraints.sort(key=lambda lists: sum(len(p) for p in lists))
+            driver, others = constraints[0], constraints[1:]
+
+            start, stop = since, until
+            if after is not None and reverse:
+                stop = after[0] + 1 if stop is None else min(stop, after[0] + 1)
+            elif after is not None:
+                start = after[0] if start is None else max(start, after[0])
+            lo = _key(start) if start is not None else None
+            hi = _key(stop) if stop is not None else None
+
+            windows = (_window(p, lo, hi, reverse) for p in driver)
+            results, group, group_ts = [], [], None
+            for key in heapq.merge(*windows, reverse=reverse):
+                if not all(any(_contains(p, key) for p in lists) for lists in others):
+                    continue
+                line = self._lines.get(key)
+                if line is None or line[1] < self._first.get(line[0], 0):
+                    continue
+                sid, seq = line
+                ts = key >> _GID_BITS
+                if ts != group_ts:
+                    # Within one second, order by (sid, seq) rather than
+                    # this process's append order.
+                    results.extend(_ordered(group, after, reverse))
+                    if len(results) >= limit:
+                        break
+                    group, group_ts = [], ts
+                if accept is None or accept(sid, seq):
+                    group.append((ts, sid, seq))
+            else:
+                results.extend(_ordered(group, after, reverse))
+        return results[:limit]
+
+    def stats(self):
+        with self._lock.read():
+            return {
+                "lines": len(self._lines) - self._dead,
+                "dead": self._dead,
+                "tokens": len(self._by_token),
+                "postings": sum(len(p) for p in self._by_token.values()),
+            }
+
+
+def _window(postings, lo, hi, reverse=False):
+    """Keys of ``postings`` in ``[lo, hi)``; either bound may be None."""
+    start = 0 if lo is None else bisect.bisect_left(postings, lo)
+    stop = len(postings) if hi is None else bisect.bisect_left(postings, hi)
+    positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+    return (postings[i] for i in positions)
+
+
+def _ordered(group, after, reverse=False):
+    group.sort(reverse=reverse)
+    if after is not None:
+        return [row for row in group if (row < after if reverse else row > after)]
+    return group
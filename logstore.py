@@ -0,0 +1,323 @@
+import calendar
+import queue
+import threading
+import time
+from array import array
+
+from concurrency import StripedLocks
+from logindex import LogIndex, tokenize
+from sse import sse_frame
+
+
+# Level enum: lines store the index into LEVELS instead of the string.
+LEVELS = ("DEBUG", "INFO", "WARN", "ERROR", "FATAL")
+LEVEL_CODES = {name: code for code, name in enumerate(LEVELS)}
+
+NO_NAME = -1
+
+
+def parse_iso(value):
+    """ISO-8601 UTC string (``2025-06-28T12:34:56Z``) -> epoch seconds."""
+    return calendar.timegm(time.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+def format_iso(epoch):
+    """Epoch seconds -> ISO-8601 UTC string, the inverse of ``parse_iso``."""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+class ServiceLog:
+    """Fixed-capacity ring buffer of one service's log lines.
+
+    Lines are kept as parallel columns (epoch timestamp, level code, interned
+    name reference, message) and only rendered back to text when read. Once
+    ``max_lines`` or ``max_bytes`` of messages is reached, the oldest lines
+    are evicted. Every line gets an absolute sequence number that survives
+    eviction, which is what log cursors point at.
+    """
+
+    __slots__ = ("max_lines", "max_bytes", "ts", "levels", "names", "messages",
+                 "head", "count", "bytes", "first_seq")
+
+    def __init__(self, max_lines, max_bytes):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.ts = array("q")
+        self.levels = array("B")
+        self.names = array("i")
+        self.messages = []
+        self.head = 0        # physical slot of the oldest line
+        self.count = 0       # lines currently retained
+        self.bytes = 0       # sum of retained message lengths
+        self.first_seq = 0   # sequence number of the oldest retained line
+
+    @property
+    def next_seq(self):
+        return self.first_seq + self.count
+
+    def append(self, ts, level, name_ref, message):
+        if self.count >= self.max_lines:
+            self._evict()
+        while self.count and self.bytes + len(message) > self.max_bytes:
+            self._evict()
+        pos = (self.head + self.count) % self.max_lines
+        if pos == len(self.messages):
+            self.ts.append(ts)
+            self.levels.append(level)
+            self.names.append(name_ref)
+            self.messages.append(message)
+        else:
+            self.ts[pos] = ts
+            self.levels[pos] = level
+            self.names[pos] = name_ref
+            self.messages[pos] = message
+        self.count += 1
+        self.bytes += len(message)
+
+    def rows(self, start_seq, stop_seq):
+        """Yield ``(ts, level, name_ref, message)`` for ``[start_seq, stop_seq)``."""
+        start = max(start_seq, self.first_seq)
+        stop = min(stop_seq, self.next_seq)
+        for seq in range(start, stop):
+            pos = (self.head + seq - self.first_seq) % self.max_lines
+            yield self.ts[pos], self.levels[pos], self.names[pos], self.messages[pos]
+
+    def _evict(self):
+        self.bytes -= len(self.messages[self.head])
+        self.messages[self.head] = None
+        self.head = (self.head + 1) % self.max_lines
+        self.count -= 1
+        self.first_seq += 1
+
+
+class LogEvent:
+    """One appended line as delivered to followers.
+
+    The same instance is handed to every subscriber, and its SSE frame is
+    encoded at most once no matter how many streams send it.
+    """
+
+    __slots__ = ("seq", "line", "_frame")
+
+    def __init__(self, seq, line):
+        self.seq = seq
+        self.line = line
+        self._frame = None
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            self._frame = sse_frame(self.line, event="log", event_id=self.seq)
+        return self._frame
+
+
+class LogSubscription:
+    """A follower's bounded inbox of LogEvents.
+
+    If the follower falls more than ``maxsize`` events behind, ``overflowed``
+    is set and the follower must re-read the gap from the buffer.
+
+    ``notify`` is called after every push, for followers that don't block
+    on the queue (e.g. an asyncio task draining it with ``get_nowait``).
+    """
+
+    def __init__(self, maxsize=1000, notify=None):
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+        self.notify = notify
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+        if self.notify is not None:
+            self.notify()
+
+
+class LogStore:
+    """Per-service bounded log storage, keyed by service id.
+
+    Each service's buffer and followers are guarded by a lock striped on the
+    service id, so appends and reads for different services rarely contend.
+    ``_lock`` only covers creating buffers and interning names.
+
+    Every line is also fed to a ``LogIndex`` (see ``search``).
+    """
+
+    def __init__(self, max_lines=10000, max_bytes=1 << 20):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self._logs = {}
+        self._subscribers = {}  # sid -> list of LogSubscription
+        self._names = []       # interned service names
+        self._name_refs = {}   # name -> index into _names
+        self._lock = threading.Lock()
+        self._stripes = StripedLocks()
+        self.index = LogIndex()
+
+    def __contains__(self, sid):
+        return sid in self._logs
+
+    def intern_name(self, name):
+        ref = self._name_refs.get(name)
+        if ref is not None:
+            return ref
+        with self._lock:
+            return self._intern(name)
+
+    def _intern(self, name):
+        ref = self._name_refs.get(name)
+        if ref is None:
+            ref = self._name_refs[name] = len(self._names)
+            self._names.append(name)
+        return ref
+
+    def append(self, sid, level, message, name=None, ts=None, seq=None):
+        """Append one line; ``ts`` defaults to now (epoch seconds).
+
+        ``seq`` is the line's sequence number when it was assigned elsewhere
+        (a shared store or a snapshot); it positions an empty log so numbers
+        match across processes and restarts.
+        """
+        log = self._logs.get(sid)
+        if log is None:
+            with self._lock:
+                log = self._logs.get(sid)
+                if log is None:
+                    log = self._logs[sid] = ServiceLog(self.max_lines, self.max_bytes)
+        name_ref = NO_NAME if name is None else self.intern_name(name)
+        row = (int(time.time()) if ts is None else ts, LEVEL_CODES[level], name_ref, message)
+        with self._stripes(sid):
+            if seq is not None and log.count == 0:
+                log.first_seq = seq
+            first = log.first_seq
+            log.append(*row)
+            line_seq, evicted = log.next_seq - 1, log.first_seq - first
+            subscribers = self._subscribers.get(sid)
+            if subscribers:
+                event = LogEvent(line_seq, self.render(row))
+                for sub in subscribers:
+                    sub.push(event)
+        self.index.add(sid, line_seq, row[0], row[1], message)
+        if evicted:
+            self.index.trim(sid, first + evicted, evicted)
+
+    def loading(self):
+        """Context for appending many lines out of time order (see ``LogIndex.loading``)."""
+        return self.index.loading()
+
+    def bounds(self, sid):
+        """``(first_seq, next_seq)`` of the retained lines for ``sid``."""
+        log = self._logs.get(sid)
+        if log is None:
+            return 0, 0
+        with self._stripes(sid):
+            return log.first_seq, log.next_seq
+
+    def lines(self, sid, start_seq, stop_seq):
+        """Rendered lines for the sequence range ``[start_seq, stop_seq)``.
+
+        Only the requested rows are copied (under the lock) and rendered, so
+        the cost is proportional to the range, not the buffer.
+        """
+        return [line for _, line in self.entries(sid, start_seq, stop_seq)]
+
+    def entries(self, sid, start_seq, stop_seq):
+        """Like ``lines`` but as ``(seq, line)`` pairs."""
+        log = self._logs.get(sid)
+        if log is None:
+            return []
+        with self._stripes(sid):
+            first = max(start_seq, log.first_seq)
+            rows = list(log.rows(start_seq, stop_seq))
+        return [(first + i, self.render(row)) for i, row in enumerate(rows)]
+
+    def search(self, q="", levels=(), sids=(), since=None, until=None, after=None, limit=100,
+               reverse=False):
+        """Matching lines across services as ``(ts, sid, seq, line)``, oldest first.
+
+        Each word of ``q`` must occur as a whole word and ``q`` itself must
+        appear in the message (case-insensitive); the index narrows
+        candidates by the words and only those are checked for the phrase.
+        See ``LogIndex.search`` for the other arguments.
+        """
+        needle = q.lower()
+
+        def accept(sid, seq):
+            return needle in self._message(sid, seq).lower()
+
+        hits = self.index.search(
+            tokens=tokenize(q),
+            levels=[LEVEL_CODES[level] for level in levels],
+            services=sids,
+            since=since,
+            until=until,
+            after=after,
+            limit=limit,
+            accept=accept if needle else None,
+            reverse=reverse,
+        )
+        results = []
+        for ts, sid, seq in hits:
+            for _, line in self.entries(sid, seq, seq + 1):
+                results.append((ts, sid, seq, line))
+        return results
+
+    def _message(self, sid, seq):
+        log = self._logs.get(sid)
+        if log is None:
+            return ""
+        with self._stripes(sid):
+            for _, _, _, message in log.rows(seq, seq + 1):
+                return message
+        return ""
+
+    def export(self):
+        """Every retained line as ``{sid: [[ts, level, name, message, seq], ...]}``."""
+        exported = {}
+        for sid, log in list(self._logs.items()):
+            with self._stripes(sid):
+                exported[sid] = [
+                    [ts, LEVELS[level], None if ref == NO_NAME else self._names[ref], message, seq]
+                    for seq, (ts, level, ref, message)
+                    in enumerate(log.rows(log.first_seq, log.next_seq), log.first_seq)
+                ]
+        return exported
+
+    def subscribe(self, sid, maxsize=1000, notify=None):
+        """Register a follower; returns ``(subscription, next_seq)`` atomically.
+
+        Every line with a sequence number >= ``next_seq`` will be pushed to
+        the subscription; anything older must be read with ``entries``.
+        """
+        sub = LogSubscription(maxsize, notify)
+        with self._stripes(sid):
+            self._subscribers.setdefault(sid, []).append(sub)
+            log = self._logs.get(sid)
+            return sub, (log.next_seq if log else 0)
+
+    def unsubscribe(self, sid, sub):
+        with self._stripes(sid):
+            subscribers = self._subscribers.get(sid, [])
+            if sub in subscribers:
+                subscribers.remove(sub)
+            if not subscribers:
+                self._subscribers.pop(sid, None)
+
+    def render(self, row):
+        ts, level, name_ref, message = row
+        if name_ref == NO_NAME:
+            return f"{format_iso(ts)} {LEVELS[level]} {message}"
+        return f"{format_iso(ts)} {LEVELS[level]} {self._names[name_ref]} {message}"
+
+    def stats(self):
+        """Retained line and message-byte totals across every service."""
+        logs = list(self._logs.values())
+        return {
+            "subscribers": sum(len(subs) for subs in list(self._subscribers.values())),
+            "services": len(logs),
+            "lines": sum(log.count for log in logs),
+            "bytes": sum(log.bytes for log in logs),
+            "index": self.index.stats(),
+        }
@@ -0,0 +1,144 @@
+import bisect
+import threading
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DURATION_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Metrics:
+    """Counters and histograms exported in the Prometheus text format.
+
+    Each thread records into its own shard (a plain dict reached through a
+    ``threading.local``), so ``inc`` / ``observe`` never take a lock; shards
+    are only summed when ``/metrics`` is scraped. Values that already live
+    elsewhere (queue depth, cache sizes, ...) are registered as collectors
+    and read at scrape time instead of being mirrored on every change.
+
+    A shard outlives its thread only until the next shard is created or the
+    next scrape, when it is folded into ``_base``; servers that use a thread
+    per request therefore keep one shard per live thread, not per request.
+
+    Labels are passed as a tuple of ``(name, value)`` pairs.
+    """
+
+    def __init__(self):
+        self._families = {}    # name -> (type, help, buckets)
+        self._collectors = []  # (name, type, help, fn -> [(labels, value)])
+        self._shards = []      # (thread, shard) for threads that have recorded
+        self._base = {}        # folded shards of finished threads
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def counter(self, name, help):
+        self._families[name] = ("counter", help, None)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._families[name] = ("histogram", help, tuple(buckets))
+
+    def collector(self, name, type, help, fn):
+        """Register ``fn() -> [(labels, value), ...]``, called on each scrape."""
+        self._collectors.append((name, type, help, fn))
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold_finished()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_finished(self):
+        """Merge shards of threads that have exited into ``_base`` (lock held)."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._base, shard)
+        self._shards = live
+
+    def inc(self, name, labels=(), value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        shard = self._shard()
+        key = (name, labels)
+        series = shard.get(key)
+        if series is None:
+            buckets = self._families[name][2]
+            # one count per bucket plus +Inf, then sum and count
+            series = shard[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self._families[name][2], value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    # ------------------------------------------------------------------
+    #  Export
+    # ------------------------------------------------------------------
+    def _totals(self):
+        with self._lock:
+            self._fold_finished()
+            totals = {}
+            _merge(totals, self._base)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(totals, shard)
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        by_family = {}
+        for (name, labels), value in self._totals().items():
+            by_family.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help, buckets) in self._families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_family.get(name, ())):
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(buckets + ("+Inf",), value):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                    lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for name, kind, help, fn in self._collectors:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in fn():
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(totals, shard):
+    """Add ``shard``'s counters and histogram series into ``totals``."""
+    for key, value in shard.copy().items():
+        if isinstance(value, list):
+            merged = totals.get(key)
+            totals[key] = list(value) if merged is None else [a + b for a, b in zip(merged, value)]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by ``OperationExecutor.submit`` when admission would exceed capacity."""
+
+    def __init__(self, depth, capacity):
+        super().__init__(f"operation queue full ({depth}/{capacity})")
+        self.depth = depth
+        self.capacity = capacity
+
+
+_DONE = object()  # what ``next`` returns for a finished job
+
+
+class _Job:
+    __slots__ = ("id", "key", "steps", "cancelled")
+
+    def __init__(self, job_id, key, steps):
+        self.id = job_id
+        self.key = key
+        self.steps = steps
+        self.cancelled = False
+
+
+class OperationExecutor:
+    """Runs operations on a fixed pool of worker threads.
+
+    An operation is a generator: each ``yield <seconds>`` hands the job back
+    to a heap-based timer instead of sleeping in a thread, so thousands of
+    in-flight operations only occupy a worker while a step is actually
+    running.
+
+    Jobs submitted with the same ``key`` coalesce, latest wins: the
+    previous unfinished job for that key is cancelled. If it is still
+    waiting out its initial ``delay`` it never starts; if it is running, its
+    generator is closed at its next step instead of being resumed.
+    """
+
+    def __init__(self, workers=4, capacity=10000):
+        self.workers = workers
+        self.capacity = capacity
+        self._ready = queue.SimpleQueue()
+        self._timers = []  # heap of (due, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._latest = {}  # key -> newest unfinished job
+        self._in_flight = 0
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    #  Public API
+    # ------------------------------------------------------------------
+    def submit(self, job_id, steps, key=None, delay=0.0):
+        """Schedule a generator of step delays to start after ``delay`` seconds.
+
+        Returns the id of the job this one superseded, if any (pending or
+        running; see the class docstring). Raises ``QueueFull`` when
+        ``capacity`` jobs are already in flight.
+        """
+        job = _Job(job_id, key, steps)
+        superseded = None
+        with self._cond:
+            previous = self._latest.get(key) if key is not None else None
+            if previous is not None:
+                previous.cancelled = True
+                superseded = previous.id
+                self._in_flight -= 1
+            elif self._in_flight >= self.capacity:
+                raise QueueFull(self._in_flight, self.capacity)
+            if key is not None:
+                self._latest[key] = job
+            self._in_flight += 1
+            self._start()
+            self._schedule(job, delay)
+        return superseded
+
+    def stats(self):
+        """Queue depth snapshot, e.g. for backpressure responses and metrics."""
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "scheduled": len(self._timers),
+                "ready": self._ready.qsize(),
+                "capacity": self.capacity,
+                "workers": self.workers,
+            }
+
+    # ------------------------------------------------------------------
+    #  Internals
+    # ------------------------------------------------------------------
+    def _start(self):
+        """Spawn the timer and worker threads on first use (post-fork safe)."""
+        if self._threads:
+            return
+        timer = threading.Thread(target=self._timer_loop, name="ops-timer", daemon=True)
+        self._threads.append(timer)
+        for i in range(self.workers):
+            self._threads.append(
+                threading.Thread(target=self._worker_loop, name=f"ops-worker-{i}", daemon=True)
+            )
+        for thread in self._threads:
+            thread.start()
+
+    def _schedule(self, job, delay):
+        with self._cond:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._seq), job))
+            self._cond.notify()
+
+    def _timer_loop(self):
+        while True:
+            with self._cond:
+                while not self._timers or self._timers[0][0] > time.monotonic():
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    self._cond.wait(timeout)
+                _, _, job = heapq.heappop(self._timers)
+            self._ready.put(job)
+
+    def _worker_loop(self):
+        while True:
+            job = self._ready.get()
+            with self._cond:
+                cancelled = job.cancelled
+            if cancelled:
+                job.steps.close()
+                continue
+            try:
+                delay = next(job.steps)
+            except StopIteration:
+                self._finish(job)
+                continue
+            except Exception:
+                log.exception("operation %s crashed", job.id)
+                self._finish(job)
+                continue
+            self._schedule(job, max(float(delay or 0), 0.0))
+
+    def _finish(self, job):
+        with self._cond:
+            # A job superseded while its last step ran was already counted
+            # out by ``submit``.
+            if job.cancelled:
+                return
+            self._in_flight -= 1
+            if self._latest.get(job.key) is job:
+                del self._latest[job.key]
+
+
+class AsyncOperationExecutor:
+    """``OperationExecutor`` on an asyncio event loop instead of threads.
+
+    Same contract (``submit`` / ``stats``, coalescing by ``key``,
+    ``QueueFull`` past ``capacity``), but the delays a job yields are
+    ``call_later`` timers on ``loop``, so waiting operations cost nothing
+    but a timer handle. The steps themselves (which write to the store and
+    may block on its backend) run on a pool of ``workers`` threads, never
+    on the loop. ``submit`` may be called from any thread.
+    """
+
+    def __init__(self, workers=4, capacity=10000, loop=None):
+        self.workers = workers
+        self.capacity = capacity
+        self.loop = loop
+        # Its threads start on first use, so this is post-fork safe too.
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ops-worker")
+        self._lock = threading.Lock()
+        self._latest = {}  # key -> newest unfinished job
+        self._in_flight = 0
+        self._scheduled = 0
+
+    def bind(self, loop):
+        """Run jobs on ``loop`` (the serving loop, once it exists)."""
+        self.loop = loop
+
+    def submit(self, job_id, steps, key=None, delay=0.0):
+        if self.loop is None:
+            raise RuntimeError("AsyncOperationExecutor is not bound to an event loop")
+        job = _Job(job_id, key, steps)
+        superseded = None
+        with self._lock:
+            previous = self._latest.get(key) if key is not None else None
+            if previous is not None:
+                previous.cancelled = True
+                superseded = previous.id
+                self._in_flight -= 1
+            elif self._in_flight >= self.capacity:
+                raise QueueFull(self._in_flight, self.capacity)
+            if key is not None:
+                self._latest[key] = job
+            self._in_flight += 1
+            self._scheduled += 1
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, self._step, job)
+        return superseded
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "scheduled": self._scheduled,
+                "ready": 0,
+                "capacity": self.capacity,
+                "workers": self.workers,
+            }
+
+    def _step(self, job):
+        with self._lock:
+            self._scheduled -= 1
+            cancelled = job.cancelled
+        if cancelled:
+            self.loop.run_in_executor(self.pool, job.steps.close)
+            return
+        future = self.loop.run_in_executor(self.pool, next, job.steps, _DONE)
+        future.add_done_callback(lambda done: self._stepped(job, done))
+
+    def _stepped(self, job, future):
+        exc = future.exception()
+        if exc is not None:
+            log.error("operation %s crashed", job.id, exc_info=exc)
+            self._finish(job)
+            return
+        delay = future.result()
+        if delay is _DONE:
+            self._finish(job)
+            return
+        with self._lock:
+            self._scheduled += 1
+        self.loop.call_later(max(float(delay or 0), 0.0), self._step, job)
+
+    def _finish(self, job):
+        with self._lock:
+            # A job superseded while its last step ran was already counted
+            # out by ``submit``.
+            if job.cancelled:
+                return
+            self._in_flight -= 1
+            if self._latest.get(job.key) is job:
+                del self._latest[job.key]
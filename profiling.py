@@ -0,0 +1,205 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+# Stacks whose innermost Python frame is in one of these files are threads
+# parked on a lock, queue or socket; the process sampler skips them so the
+# aggregate shows where CPU goes rather than who is waiting.
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socket.py", "socketserver.py")
+
+# Worker and background loops that park in C (``SimpleQueue.get``,
+# ``time.sleep``, ``os.fsync``) with no Python frame below them. As the
+# innermost frame they mean the thread is waiting; while it works, the
+# work's own frames sit below them and are sampled as usual.
+IDLE_FUNCTIONS = (
+    ("_worker", "thread.py"),             # concurrent.futures pool threads
+    ("_worker_loop", "operations.py"),    # ops-worker-*
+    ("_flush_loop", "storage.py"),        # journal-flush
+    ("_heartbeat_loop", "sre_api.py"),    # worker-heartbeat
+)
+
+
+def is_idle(frame):
+    """Whether a thread whose innermost frame is ``frame`` is parked, not working."""
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return filename in IDLE_FILES or (code.co_name, filename) in IDLE_FUNCTIONS
+
+
+def capture(frame):
+    """The stack ending at ``frame`` as a root-first tuple of ``(function, file, line)``."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _label(frame):
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class Profile:
+    """Aggregated stack samples, exportable for flamegraph tools."""
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.samples = Counter()  # stack tuple -> count
+        self.started = time.time()
+
+    def add(self, stack):
+        self.samples[stack] += 1
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format: ``frame;frame;frame count`` per line."""
+        return "".join(
+            f"{';'.join(_label(frame) for frame in stack)} {count}\n"
+            for stack, count in self.samples.most_common()
+        )
+
+    def speedscope(self):
+        """A speedscope (https://www.speedscope.app) "sampled" profile document."""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.samples.most_common():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    name, filename, line = frame
+                    frames.append({"name": name, "file": filename, "line": line})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "sre-api",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class RequestProfiler:
+    """Samples one thread's stack at a high rate while a request runs.
+
+    ``start`` returns a handle for ``stop``, which returns the Profile; at
+    most ``max_active`` requests are profiled at once (``start`` returns
+    None beyond that). Finished profiles are kept in a small LRU so they
+    can be downloaded after the response went out.
+    """
+
+    def __init__(self, interval=0.001, max_active=2, keep=20):
+        self.interval = interval
+        self.max_active = max_active
+        self.keep = keep
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._profiles = OrderedDict()  # id -> Profile
+
+    def start(self, name):
+        with self._lock:
+            if self._active >= self.max_active:
+                return None
+            self._active += 1
+        profile = Profile(name, self.interval)
+        target = threading.get_ident()
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                if frame is not None:
+                    profile.add(capture(frame))
+
+        thread = threading.Thread(target=sample, name="request-profiler", daemon=True)
+        thread.start()
+        return profile, done, thread
+
+    def stop(self, handle):
+        """Finish sampling and keep the profile; returns its id."""
+        profile, done, thread = handle
+        done.set()
+        thread.join()
+        with self._lock:
+            self._active -= 1
+            profile_id = f"prof-{next(self._ids)}"
+            self._profiles[profile_id] = profile
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+class ProcessSampler:
+    """Low-rate sampler of every thread in the process, aggregated over time.
+
+    Started lazily (so it runs in each forked worker) and skips idle
+    threads (see ``is_idle``). Distinct stacks are capped at
+    ``max_stacks``; further new stacks are counted under one overflow
+    entry so memory stays bounded however long it runs.
+    """
+
+    OVERFLOW = (("[other stacks]", "", 0),)
+
+    def __init__(self, interval=0.1, max_stacks=5000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._profile = Profile("process", interval)
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == me or is_idle(frame):
+                        continue
+                    stack = capture(frame)
+                    if stack not in self._profile.samples and len(self._profile.samples) >= self.max_stacks:
+                        stack = self.OVERFLOW
+                    self._profile.add(stack)
+
+    def snapshot(self, reset=False):
+        """A copy of the aggregate so far; ``reset`` starts a new one."""
+        with self._lock:
+            profile = Profile("process", self.interval)
+            profile.started = self._profile.started
+            profile.samples = Counter(self._profile.samples)
+            if reset:
+                self._profile = Profile("process", self.interval)
+        return profile
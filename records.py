@@ -0,0 +1,123 @@
+import calendar
+import sys
+import time
+from collections.abc import Mapping
+
+
+_MISSING = object()
+_DAYS = {}  # "YYYY-MM-DD" -> epoch of that midnight
+
+
+def parse_timestamp(value):
+    """ISO-8601 UTC string (``2025-06-28T12:34:56Z``) or epoch -> epoch seconds."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    day = _DAYS.get(value[:10])
+    if day is None:
+        day = _DAYS[value[:10]] = calendar.timegm(time.strptime(value[:10], "%Y-%m-%d"))
+    return day + int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+
+
+def format_timestamp(epoch):
+    """Epoch seconds -> ISO-8601 UTC string, as the API shows timestamps."""
+    if epoch is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+class Record(Mapping):
+    """An immutable record stored in ``__slots__`` instead of a dict.
+
+    Subclasses list their ``FIELDS`` (in API order). Fields named in
+    ``TIMESTAMPS`` hold epoch seconds and are rendered as ISO-8601 only in
+    JSON (``to_dict``); those in ``CATEGORIES`` are interned, so every
+    record with ``status == "open"`` points at the same string. Keys outside
+    ``FIELDS`` are kept in a small overflow dict.
+
+    It reads like the dict it replaces (``rec["status"]``, ``rec.get``,
+    ``{**rec}``); hot filters use attribute access (``rec.status``), which
+    skips the mapping protocol. Like the dicts before it, a record is never
+    mutated; a change builds a new one from ``{**old, **changes}`` (see
+    ``Store``).
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS = ()
+    TIMESTAMPS = ()
+    CATEGORIES = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __init__(self, values):
+        timestamps, categories = self.TIMESTAMPS, self.CATEGORIES
+        for name in self.FIELDS:
+            value = values.get(name, _MISSING)
+            if value is not _MISSING:
+                if name in timestamps:
+                    value = parse_timestamp(value)
+                elif name in categories and type(value) is str:
+                    value = sys.intern(value)
+            object.__setattr__(self, name, value)
+        extra = {key: value for key, value in values.items() if key not in self._FIELD_SET}
+        object.__setattr__(self, "_extra", extra or None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if getattr(self, name) is not _MISSING:
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+    def to_dict(self):
+        """The record as the API shows it (ISO timestamps)."""
+        return {key: format_timestamp(value) if key in self.TIMESTAMPS else value
+                for key, value in self.items()}
+
+
+class Service(Record):
+    __slots__ = FIELDS = ("id", "name", "status", "version", "replicas",
+                          "desired_replicas", "owner", "last_deploy_at")
+    TIMESTAMPS = ("last_deploy_at",)
+    CATEGORIES = ("id", "name", "status", "version", "owner")
+
+
+class Incident(Record):
+    __slots__ = FIELDS = ("id", "service_id", "severity", "status", "title",
+                          "created_at", "acked_by", "resolved_by")
+    TIMESTAMPS = ("created_at",)
+    CATEGORIES = ("service_id", "severity", "status", "title", "acked_by", "resolved_by")
+
+
+class Operation(Record):
+    __slots__ = FIELDS = ("id", "type", "target_type", "target_id", "status", "created_at",
+                          "updated_at", "metadata", "parent_id", "children", "progress", "worker")
+    TIMESTAMPS = ("created_at", "updated_at")
+    CATEGORIES = ("type", "target_type", "target_id", "status", "parent_id", "worker")
+
+
+RECORD_TYPES = {"services": Service, "incidents": Incident, "operations": Operation}
@@ -1,216 +1,232 @@
+import bisect
+import calendar
 import random
-from datetime import datetime, timedelta
-
-
-def now_iso():
-    """Return current UTC time as ISO-8601 string (e.g. 2025-06-28T12:34:56Z)."""
-    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
-
-
-def random_iso_time(days_ago=30):
-    """Return a random ISO time within the last N days."""
-    now = datetime.utcnow()
-    random_days = random.randint(0, days_ago)
-    random_hours = random.randint(0, 23)
-    random_minutes = random.randint(0, 59)
-    random_seconds = random.randint(0, 59)
-    
-    random_time = now - timedelta(
-        days=random_days,
-        hours=random_hours,
-        minutes=random_minutes,
-        seconds=random_seconds
-    )
-    return random_time.isoformat(timespec="seconds") + "Z"
-
-
-def seed_data():
-    """Populate the demo data set with large datasets for pagination testing."""
-    
-    # Service templates for generating variety
-    service_names = [
-        "api-gateway", "auth-service", "billing", "search", "notifications",
-        "user-service", "payment-processor", "email-service", "sms-service",
-        "analytics", "metrics-collector", "log-aggregator", "cache-service",
-        "database-proxy", "file-storage", "image-processor", "video-encoder",
-        "recommendation-engine", "fraud-detector", "compliance-checker",
-        "audit-logger", "backup-service", "monitoring", "alerting",
-        "dashboard", "reporting", "data-pipeline", "etl-processor",
-        "ml-training", "model-serving", "feature-store", "experiment-tracker",
-        "ab-testing", "content-cdn", "edge-cache", "load-balancer",
-        "service-mesh", "api-docs", "swagger-ui", "openapi-validator",
-        "rate-limiter", "circuit-breaker", "retry-handler", "timeout-manager",
-        "health-checker", "liveness-probe", "readiness-probe", "graceful-shutdown",
-        "config-manager", "secret-manager", "vault-client", "cert-manager",
-        "ssl-terminator", "tls-handler", "jwt-validator", "oauth-provider",
-        "saml-provider", "ldap-client", "rbac-enforcer", "permission-checker",
-        "audit-trail", "compliance-reporter", "data-classifier", "privacy-filter",
-        "gdpr-processor", "ccpa-handler", "data-retention", "backup-scheduler",
-        "disaster-recovery", "failover-manager", "cluster-coordinator", "leader-election",
-        "distributed-lock", "consensus-protocol", "raft-implementation", "paxos-handler",
-        "event-sourcing", "cqrs-processor", "saga-orchestrator", "workflow-engine",
-        "task-scheduler", "cron-manager", "job-queue", "message-broker",
-        "pub-sub", "event-stream", "kafka-producer", "kafka-consumer",
-        "redis-client", "memcached-client", "elasticsearch-client", "mongodb-client",
-        "postgres-client", "mysql-client", "cassandra-client", "dynamodb-client",
-        "s3-client", "gcs-client", "azure-blob-client", "minio-client",
-        "terraform-runner", "ansible-executor", "chef-client", "puppet-agent",
-        "kubernetes-client", "docker-client", "container-registry", "image-scanner",
-        "vulnerability-scanner", "security-auditor", "penetration-tester", "threat-detector",
-        "intrusion-detector", "anomaly-detector", "behavior-analyzer", "risk-assessor"
-    ]
-    
-    service_types = ["microservice", "api", "worker", "scheduler", "processor", "gateway", "proxy"]
-    owners = ["sre", "platform", "finops", "ml", "growth", "security", "data", "infrastructure", "devops", "backend", "frontend", "mobile", "qa", "product"]
-    statuses = ["healthy", "degraded", "down", "maintenance", "scaling"]
-    versions = ["1.0.0", "1.1.0", "1.2.0", "2.0.0", "2.1.0", "2.2.0", "3.0.0", "3.1.0", "0.1.0", "0.2.0", "0.3.0"]
-    
-    # Generate 150+ services
-    services = []
-    for i in range(150):
-        service_name = random.choice(service_names)
-        service_type = random.choice(service_types)
-        owner = random.choice(owners)
-        status = random.choice(statuses)
-        version = random.choice(versions)
-        
-        # Generate realistic replica counts based on status
-        if status == "down":
-            replicas = 0
-            desired_replicas = 0
-        elif status == "maintenance":
-            replicas = random.randint(0, 2)
-            desired_replicas = random.randint(1, 3)
-        else:
-            replicas = random.randint(1, 10)
-            desired_replicas = replicas
-        
-        service_id = f"svc-{service_name.replace('-', '')}-{i:03d}"
-        
-        service = {
-            "id": service_id,
-            "name": f"{service_name}-{service_type}",
-            "status": status,
-            "version": version,
-            "replicas": replicas,
-            "desired_replicas": desired_replicas,
-            "owner": owner,
-            "last_deploy_at": random_iso_time(7)  # Deployed within last week
-        }
-        services.append(service)
-    
-    # Generate incidents for some services
-    incidents = []
-    incident_templates = [
-        "High error rate detected",
-        "Response time degradation",
-        "Memory usage spike",
-        "CPU utilization high",
-        "Disk space low",
-        "Network connectivity issues",
-        "Database connection pool exhausted",
-        "Cache hit rate dropped",
-        "Queue backlog growing",
-        "Authentication failures",
-        "Authorization errors",
-        "Rate limit exceeded",
-        "Circuit breaker opened",
-        "Health check failing",
-        "Service discovery issues",
-        "Load balancer problems",
-        "SSL certificate expired",
-        "DNS resolution failures",
-        "Time synchronization issues",
-        "Resource contention detected"
-    ]
-    
-    severities = ["low", "medium", "high", "critical"]
-    incident_statuses = ["open", "acknowledged", "resolved"]
-    
-    # Generate 50+ incidents
-    for i in range(50):
-        service = random.choice(services)
-        severity = random.choice(severities)
-        status = random.choice(incident_statuses)
-        title = random.choice(incident_templates)
-        
-        incident_id = f"inc-{i+1001:04d}"
-        
-        incident = {
-            "id": incident_id,
-            "service_id": service["id"],
-            "severity": severity,
-            "status": status,
-            "title": f"{title} - {service['name']}",
-            "created_at": random_iso_time(30),  # Created within last month
-            "acked_by": "alice" if status in ["acknowledged", "resolved"] else None,
-            "resolved_by": "bob" if status == "resolved" else None
-        }
-        incidents.append(incident)
-    
-    return services, incidents
-
-
-def generate_logs_for_service(service):
-    """Generate realistic log entries for a service."""
-    logs = []
-    
-    # Initial startup logs
-    logs.append(f'{service["last_deploy_at"]} INFO {service["name"]} starting version={service["version"]}')
-    logs.append(f'{service["last_deploy_at"]} INFO {service["name"]} health check passed')
-    
-    # Generate logs based on service status
-    if service["status"] == "healthy":
-        # Generate normal operation logs
-        for _ in range(random.randint(5, 15)):
-            log_time = random_iso_time(1)  # Within last day
-            log_level = random.choice(["INFO", "DEBUG"])
-            log_messages = [
-                f"Processing request",
-                f"Cache hit",
-                f"Database query completed",
-                f"Response sent",
-                f"Metrics updated",
-                f"Health check passed",
-                f"Memory usage normal",
-                f"CPU usage normal"
-            ]
-            logs.append(f'{log_time} {log_level} {service["name"]} {random.choice(log_messages)}')
-    
-    elif service["status"] == "degraded":
-        # Mix of normal and warning logs
-        for _ in range(random.randint(3, 8)):
-            log_time = random_iso_time(1)
-            log_level = random.choice(["INFO", "WARN"])
-            log_messages = [
-                "Response time increased",
-                "Memory usage elevated",
-                "Cache miss rate high",
-                "Database connection slow",
-                "Queue processing delayed",
-                "Health check slow",
-                "CPU usage high",
-                "Disk I/O increased"
-            ]
-            logs.append(f'{log_time} {log_level} {service["name"]} {random.choice(log_messages)}')
-    
-    elif service["status"] == "down":
-        # Error logs leading to failure
-        for _ in range(random.randint(2, 5)):
-            log_time = random_iso_time(1)
-            log_level = random.choice(["ERROR", "FATAL"])
-            log_messages = [
-                "Service unavailable",
-                "Health check failed",
-                "Out of memory",
-                "Database connection lost",
-                "Network timeout",
-                "Process crashed",
-                "Configuration error",
-                "Dependency unavailable"
-            ]
-            logs.append(f'{log_time} {log_level} {service["name"]} {random.choice(log_messages)}')
-    
-    # Sort logs by timestamp
-    logs.sort(key=lambda x: x.split(' ')[0])
-    return logs
+import time
+
+
+DAY = 86400
+
+SERVICE_NAMES = [
+    "api-gateway", "auth-service", "billing", "search", "notifications",
+    "user-service", "payment-processor", "email-service", "sms-service",
+    "analytics", "metrics-collector", "log-aggregator", "cache-service",
+    "database-proxy", "file-storage", "image-processor", "video-encoder",
+    "recommendation-engine", "fraud-detector", "compliance-checker",
+    "audit-logger", "backup-service", "monitoring", "alerting",
+    "dashboard", "reporting", "data-pipeline", "etl-processor",
+    "ml-training", "model-serving", "feature-store", "experiment-tracker",
+    "ab-testing", "content-cdn", "edge-cache", "load-balancer",
+    "service-mesh", "api-docs", "swagger-ui", "openapi-validator",
+    "rate-limiter", "circuit-breaker", "retry-handler", "timeout-manager",
+    "health-checker", "liveness-probe", "readiness-probe", "graceful-shutdown",
+    "config-manager", "secret-manager", "vault-client", "cert-manager",
+    "ssl-terminator", "tls-handler", "jwt-validator", "oauth-provider",
+    "saml-provider", "ldap-client", "rbac-enforcer", "permission-checker",
+    "audit-trail", "compliance-reporter", "data-classifier", "privacy-filter",
+    "gdpr-processor", "ccpa-handler", "data-retention", "backup-scheduler",
+    "disaster-recovery", "failover-manager", "cluster-coordinator", "leader-election",
+    "distributed-lock", "consensus-protocol", "raft-implementation", "paxos-handler",
+    "event-sourcing", "cqrs-processor", "saga-orchestrator", "workflow-engine",
+    "task-scheduler", "cron-manager", "job-queue", "message-broker",
+    "pub-sub", "event-stream", "kafka-producer", "kafka-consumer",
+    "redis-client", "memcached-client", "elasticsearch-client", "mongodb-client",
+    "postgres-client", "mysql-client", "cassandra-client", "dynamodb-client",
+    "s3-client", "gcs-client", "azure-blob-client", "minio-client",
+    "terraform-runner", "ansible-executor", "chef-client", "puppet-agent",
+    "kubernetes-client", "docker-client", "container-registry", "image-scanner",
+    "vulnerability-scanner", "security-auditor", "penetration-tester", "threat-detector",
+    "intrusion-detector", "anomaly-detector", "behavior-analyzer", "risk-assessor"
+]
+
+SERVICE_TYPES = ["microservice", "api", "worker", "scheduler", "processor", "gateway", "proxy"]
+OWNERS = [
+    "sre", "platform", "finops", "ml", "growth", "security", "data",
+    "infrastructure", "devops", "backend", "frontend", "mobile", "qa", "product",
+]
+STATUSES = ["healthy", "degraded", "down", "maintenance", "scaling"]
+VERSIONS = [
+    "1.0.0", "1.1.0", "1.2.0", "2.0.0", "2.1.0", "2.2.0",
+    "3.0.0", "3.1.0", "0.1.0", "0.2.0", "0.3.0",
+]
+
+INCIDENT_TEMPLATES = [
+    "High error rate detected",
+    "Response time degradation",
+    "Memory usage spike",
+    "CPU utilization high",
+    "Disk space low",
+    "Network connectivity issues",
+    "Database connection pool exhausted",
+    "Cache hit rate dropped",
+    "Queue backlog growing",
+    "Authentication failures",
+    "Authorization errors",
+    "Rate limit exceeded",
+    "Circuit breaker opened",
+    "Health check failing",
+    "Service discovery issues",
+    "Load balancer problems",
+    "SSL certificate expired",
+    "DNS resolution failures",
+    "Time synchronization issues",
+    "Resource contention detected"
+]
+
+SEVERITIES = ["low", "medium", "high", "critical"]
+INCIDENT_STATUSES = ["open", "acknowledged", "resolved"]
+
+# Service status -> (line count range, levels, messages) of its recent logs.
+LOG_PROFILES = {
+    "healthy": ((5, 15), ["INFO", "DEBUG"], [
+        "Processing request",
+        "Cache hit",
+        "Database query completed",
+        "Response sent",
+        "Metrics updated",
+        "Health check passed",
+        "Memory usage normal",
+        "CPU usage normal",
+    ]),
+    "degraded": ((3, 8), ["INFO", "WARN"], [
+        "Response time increased",
+        "Memory usage elevated",
+        "Cache miss rate high",
+        "Database connection slow",
+        "Queue processing delayed",
+        "Health check slow",
+        "CPU usage high",
+        "Disk I/O increased",
+    ]),
+    "down": ((2, 5), ["ERROR", "FATAL"], [
+        "Service unavailable",
+        "Health check failed",
+        "Out of memory",
+        "Database connection lost",
+        "Network timeout",
+        "Process crashed",
+        "Configuration error",
+        "Dependency unavailable",
+    ]),
+    "maintenance": ((1, 4), ["INFO", "WARN"], [
+        "Maintenance window started",
+        "Draining connections",
+        "Traffic shifted away",
+        "Applying configuration",
+        "Running migrations",
+        "Maintenance mode active",
+    ]),
+    "scaling": ((2, 6), ["INFO"], [
+        "Scaling replicas",
+        "Replica started",
+        "Replica ready",
+        "Waiting for capacity",
+        "Load rebalanced",
+        "Autoscaler target updated",
+    ]),
+}
+
+_DAY_PREFIXES = {}  # epoch day -> "YYYY-MM-DDT"
+_CLOCK = []  # second of the day -> "HH:MM:SSZ", filled on first use
+
+
+def iso_time(epoch):
+    """Epoch seconds -> ISO-8601 UTC string from precomputed date and clock parts."""
+    if not _CLOCK:
+        _CLOCK.extend(f"{h:02d}:{m:02d}:{s:02d}Z"
+                      for h in range(24) for m in range(60) for s in range(60))
+    day, seconds = divmod(epoch, DAY)
+    prefix = _DAY_PREFIXES.get(day)
+    if prefix is None:
+        prefix = _DAY_PREFIXES[day] = time.strftime("%Y-%m-%dT", time.gmtime(day * DAY))
+    return prefix + _CLOCK[seconds]
+
+
+class DataGenerator:
+    """Bulk, reproducible generator of the demo data set.
+
+    Every draw comes from one ``random.Random(seed)`` and times count back
+    from ``now`` (default: the current second), so the same seed and ``now``
+    give the same data. Fields are drawn a column at a time with
+    ``choices(k=...)`` rather than one call per value, and log timestamps are
+    drawn as integers and sorted before any line is formatted.
+    """
+
+    def __init__(self, seed=None, now=None):
+        self.rng = random.Random(seed)
+        self.now = int(time.time()) if now is None else int(now)
+        self._deployed = {}  # service id -> last_deploy_at epoch
+
+    def times(self, count, days_ago):
+        """``count`` random epochs within the last ``days_ago`` days (plus today)."""
+        now = self.now
+        return [now - offset for offset in self.rng.choices(range((days_ago + 1) * DAY), k=count)]
+
+    def services(self, count):
+        rng = self.rng
+        names = rng.choices(SERVICE_NAMES, k=count)
+        types = rng.choices(SERVICE_TYPES, k=count)
+        statuses = rng.choices(STATUSES, k=count)
+        replicas = rng.choices(range(1, 11), k=count)
+        deployed = self.times(count, 7)  # deployed within last week
+        compact = {name: name.replace("-", "") for name in SERVICE_NAMES}
+        ids = [f"svc-{compact[name]}-{i:03d}" for i, name in enumerate(names)]
+        self._deployed.update(zip(ids, deployed))
+
+        # Realistic replica counts based on status
+        desired = list(replicas)
+        for i, status in enumerate(statuses):
+            if status == "down":
+                replicas[i] = desired[i] = 0
+            elif status == "maintenance":
+                replicas[i], desired[i] = rng.randint(0, 2), rng.randint(1, 3)
+
+        return [
+            {"id": sid, "name": f"{name}-{kind}", "status": status, "version": version,
+             "replicas": current, "desired_replicas": wanted, "owner": owner,
+             "last_deploy_at": iso_time(ts)}
+            for sid, name, kind, status, version, current, wanted, owner, ts in zip(
+                ids, names, types, statuses, rng.choices(VERSIONS, k=count), replicas, desired,
+                rng.choices(OWNERS, k=count), deployed)
+        ]
+
+    def incidents(self, services, count):
+        rng = self.rng
+        statuses = rng.choices(INCIDENT_STATUSES, k=count)
+        acked = {"open": None, "acknowledged": "alice", "resolved": "alice"}
+        resolved = {"open": None, "acknowledged": None, "resolved": "bob"}
+        return [
+            {"id": f"inc-{i:04d}", "service_id": service["id"], "severity": severity,
+             "status": status, "title": f"{title} - {service['name']}",
+             "created_at": iso_time(ts), "acked_by": acked[status], "resolved_by": resolved[status]}
+            for i, service, severity, status, title, ts in zip(
+                range(1001, count + 1001), rng.choices(services, k=count),
+                rng.choices(SEVERITIES, k=count), statuses,
+                rng.choices(INCIDENT_TEMPLATES, k=count),
+                self.times(count, 30))  # created within last month
+        ]
+
+    def log_rows(self, service, lines=None):
+        """A service's log as time-ordered ``[ts, level, name, message]`` rows.
+
+        Two startup lines at its last deploy, then ``lines`` status-dependent
+        lines from the last day (a handful by default).
+        """
+        name = service["name"]
+        deployed = self._deployed.get(service["id"])
+        if deployed is None:
+            deployed = calendar.timegm(
+                time.strptime(service["last_deploy_at"], "%Y-%m-%dT%H:%M:%SZ"))
+        startup = [[deployed, "INFO", name, f'starting version={service["version"]}'],
+                   [deployed, "INFO", name, "health check passed"]]
+        (low, high), levels, messages = LOG_PROFILES[service["status"]]
+        rng = self.rng
+        count = rng.randint(low, high) if lines is None else lines
+        stamps = sorted(self.times(count, 1))  # within last day
+        rows = [[ts, level, name, message]
+                for ts, level, message in zip(stamps, rng.choices(levels, k=count),
+                                              rng.choices(messages, k=count))]
+        # Startup lines sort first among equal timestamps.
+        at = bisect.bisect_left(stamps, deployed)
+        rows[at:at] = startup
+        return rows
+
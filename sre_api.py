@@ -1,15 +1,39 @@
+import base64
+import json
+import logging
+import math
+import os
+import queue
+import threading
 import time
 import uuid
-import threading
+from collections import Counter, deque
 from datetime import datetime
 from functools import wraps
 
-from flask import Flask, jsonify, request, g
+from flask import Flask, Response, jsonify, request, g, stream_with_context
 from flask_cors import CORS
 
-from seed_data import seed_data, generate_logs_for_service
+from cache import ResponseCache
+from compression import Compression
+from indexes import IncidentIndex, ServiceIndex
+from jsonio import EncodedRecords, FastJSONProvider, envelope, iter_envelope
+from logstore import LEVEL_CODES, LogStore, format_iso, parse_iso
+from metrics import DURATION_BUCKETS, SIZE_BUCKETS, Metrics
+from operations import OperationExecutor, QueueFull
+from profiling import ProcessSampler, RequestProfiler
+from records import RECORD_TYPES
+from seed_data import DataGenerator
+from sse import sse_comment, sse_frame, sse_retry
+from storage import APPEND, DELETE, LOG_COLLECTION, PUT, Conflict, Store, make_backend
+from summary import SummaryCounters
+from versions import Versions
+from watchers import TooManyWaiters, WatchRegistry
+
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # ----------------------------------------------------------------------
@@ -17,10 +41,133 @@ CORS(app)
 # ----------------------------------------------------------------------
 API_KEY = "dev-secret"
 
-SERVICES = {}
-INCIDENTS = {}
-OPERATIONS = {}
-LOGS = {}
+# Every write goes through STORE's change feed (see storage.py). With
+# STORE_BACKEND=sqlite the feed is shared, so several gunicorn workers can
+# serve the same data; the default memory backend keeps it in-process.
+# STORE_BACKEND=journal persists a single process's state to disk instead.
+LOG_MAX_LINES = int(os.environ.get("LOG_MAX_LINES", 10000))
+STORE = Store(make_backend(
+    os.environ.get("STORE_BACKEND"),
+    path=os.environ.get("STORE_PATH"),
+    log_max_lines=LOG_MAX_LINES,
+    fsync_interval=float(os.environ.get("JOURNAL_FSYNC_SECONDS", 1.0)),
+    snapshot_every=int(os.environ.get("SNAPSHOT_EVERY", 10000)),
+), record_types=RECORD_TYPES)
+
+# SEED_LAZY=1 loads the seed data set in a background thread (see
+# _bootstrap) so the process answers healthz at once; SEEDED marks the end.
+SEED_LAZY = os.environ.get("SEED_LAZY", "") not in ("", "0")
+SEEDED = threading.Event()
+
+SERVICES = STORE.collections["services"]
+INCIDENTS = STORE.collections["incidents"]
+OPERATIONS = STORE.collections["operations"]
+# Bounded per-service ring buffers of log lines (see logstore.py).
+LOGS = LogStore(
+    max_lines=LOG_MAX_LINES,
+    max_bytes=int(os.environ.get("LOG_MAX_BYTES", 1 << 20)),
+)
+
+# Change counters behind the ETags, bumped for every change STORE applies.
+# Per-service log versions are the log sequence numbers (LOGS.bounds).
+VERSIONS = Versions(epoch=STORE.epoch)
+
+# Serialized list responses keyed by normalized query; entries are dropped
+# as soon as their collection's version moves on.
+RESPONSE_CACHE = ResponseCache(max_bytes=int(os.environ.get("RESPONSE_CACHE_BYTES", 16 << 20)))
+VERSIONS.subscribe(RESPONSE_CACHE.invalidate)
+
+# Status/owner buckets and sorted orderings over SERVICES (see indexes.py).
+SERVICE_INDEX = ServiceIndex()
+
+# Service/status/severity buckets, the severity-ranked listing order and
+# per-service open counts over INCIDENTS (see indexes.py).
+INCIDENT_INDEX = IncidentIndex()
+
+# Response compression (gzip, plus br/zstd when installed). Bodies kept in
+# RESPONSE_CACHE are also cached compressed, once per encoding.
+COMPRESSION = Compression(
+    min_bytes=int(os.environ.get("COMPRESSION_MIN_BYTES", 1024)),
+    levels={
+        encoding: int(os.environ[var])
+        for encoding, var in (("gzip", "GZIP_LEVEL"), ("br", "BROTLI_LEVEL"), ("zstd", "ZSTD_LEVEL"))
+        if var in os.environ
+    },
+)
+
+# Encoded JSON of each record, reused by list and detail responses until
+# the record changes (see jsonio.py).
+RECORD_JSON = EncodedRecords()
+
+# Log responses longer than this many lines are streamed in chunks of it.
+LOG_STREAM_LINES = 1000
+
+# Dashboard counts behind /v1/summary, maintained per change (see summary.py).
+SUMMARY = SummaryCounters({
+    "services": {
+        "by_status": lambda svc: svc.status,
+        "by_owner": lambda svc: svc.owner,
+    },
+    "incidents": {
+        "by_status": lambda inc: inc.status,
+        "by_severity": lambda inc: inc.severity,
+        "unresolved_by_severity": lambda inc: None if inc.status == "resolved" else inc.severity,
+    },
+})
+
+# Server-Sent Events tuning for streaming endpoints.
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+# Streams are recycled after this long; clients resume via Last-Event-ID.
+SSE_MAX_SECONDS = float(os.environ.get("SSE_MAX_SECONDS", 300))
+# Each log follower holds a server thread under WSGI, so only this many may
+# be open at once (per worker); further ones get a 503. The ASGI entry
+# point (sre_asgi.py) follows logs on the event loop and is not capped.
+LOG_FOLLOWERS = threading.BoundedSemaphore(int(os.environ.get("LOG_FOLLOWERS_MAX", 8)))
+
+# Long-poll / watch waiters on OPERATIONS, keyed by op id. The cap keeps
+# parked requests from using up the gunicorn thread pool.
+OPERATION_WATCHERS = WatchRegistry(max_waiters=int(os.environ.get("LONGPOLL_MAX_WAITERS", 4)))
+LONGPOLL_MAX_SECONDS = 30
+TERMINAL_OPERATION_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Fixed worker pool that runs every restart/scale/deploy (see operations.py).
+EXECUTOR = OperationExecutor(
+    workers=int(os.environ.get("OPS_WORKERS", 4)),
+    capacity=int(os.environ.get("OPS_CAPACITY", 10000)),
+)
+
+# Operations run in the process that created them, so each records that
+# process's WORKER_ID. On a shared backend every process heartbeats into
+# the "workers" collection; one silent for WORKER_TIMEOUT_SECONDS is gone,
+# and its unfinished operations are failed (see _reap_operations).
+WORKER_ID = uuid.uuid4().hex[:8]
+WORKER_HEARTBEAT_SECONDS = float(os.environ.get("WORKER_HEARTBEAT_SECONDS", 5))
+WORKER_TIMEOUT_SECONDS = float(os.environ.get("WORKER_TIMEOUT_SECONDS", 30))
+
+# Request, operation and state metrics served on /metrics (see metrics.py).
+METRICS = Metrics()
+METRICS.counter("http_requests_total", "Requests by method, route and status.")
+METRICS.histogram("http_request_duration_seconds", "Request latency by method and route.")
+METRICS.histogram("http_response_size_bytes", "Response body size by method and route.",
+                  buckets=SIZE_BUCKETS)
+METRICS.counter("operations_total", "Finished operations by type and final status.")
+METRICS.histogram("operation_duration_seconds", "Operation run time by type and final status.",
+                  buckets=DURATION_BUCKETS)
+
+# Opt-in profiling: per request via `X-Profile: 1` / `?profile=1` (API key
+# required), plus an always-on low-rate sampler of the whole process
+# (PROFILE_SAMPLE_SECONDS=0 turns it off). See profiling.py.
+REQUEST_PROFILER = RequestProfiler(interval=float(os.environ.get("PROFILE_REQUEST_SECONDS", 0.001)))
+PROCESS_SAMPLER = ProcessSampler(interval=float(os.environ.get("PROFILE_SAMPLE_SECONDS", 0.1)))
+
+# Batch operations: size cap per request, and how often a batch checks on
+# its children. Restarts and deploys take a service down while they run,
+# so only those count against a batch's max_unavailable.
+BATCH_MAX_OPERATIONS = int(os.environ.get("BATCH_MAX_OPERATIONS", 1000))
+BATCH_POLL_SECONDS = 0.25
+OPERATION_TYPES = ("restart", "scale", "deploy")
+MAX_REPLICAS = int(os.environ.get("MAX_REPLICAS", 10000))
+DISRUPTIVE_OPERATION_TYPES = ("restart", "deploy")
 
 
 def now_iso():
@@ -28,35 +175,252 @@ def now_iso():
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 
-# Initialize data using the external seed_data module
-services_data, incidents_data = seed_data()
-print(f"DEBUG: Generated {len(services_data)} services and {len(incidents_data)} incidents")
+def update_service(sid, **changes):
+    """Apply field changes to a service."""
+    return STORE.update("services", sid, **changes)
+
+
+def put_incident(incident):
+    """Insert (or replace) an incident record."""
+    return STORE.put("incidents", incident)
+
+
+def update_incident(iid, expect=None, **changes):
+    """Apply field changes to an incident.
+
+    ``expect`` makes it a compare-and-set (see ``Store.update``); a
+    concurrent transition then raises ``Conflict`` instead of being lost.
+    """
+    return STORE.update("incidents", iid, expect=expect, **changes)
+
+
+def update_operation(op_id, expect=None, **changes):
+    """Apply field changes to an operation and bump `updated_at`.
 
-# Populate the in-memory databases
-for service in services_data:
-    SERVICES[service["id"]] = service
-    LOGS[service["id"]] = generate_logs_for_service(service)
+    `expect` makes it a compare-and-set (see `Store.update`).
+    """
+    return STORE.update("operations", op_id, expect=expect, updated_at=int(time.time()), **changes)
 
-for incident in incidents_data:
-    INCIDENTS[incident["id"]] = incident
 
-print(f"DEBUG: Populated SERVICES with {len(SERVICES)} services")
+def append_log(sid, level, message):
+    """Append a log line for a service, timestamped now."""
+    STORE.append_log(sid, [int(time.time()), level, None, message])
+
+
+def _apply_change(collection, key, old, new, seq):
+    """Keep every derived structure in step with each change STORE applies.
+
+    This runs for local writes and for writes replayed from other workers
+    alike, so indexes, ETags, caches and watchers agree across processes.
+    """
+    if collection == LOG_COLLECTION:
+        ts, level, name, message, *line_seq = new
+        LOGS.append(key, level, message, name=name, ts=ts, seq=line_seq[0] if line_seq else None)
+        return
+    if collection == "services":
+        if new is None:
+            SERVICE_INDEX.remove(key)
+        elif old is None:
+            SERVICE_INDEX.add(new)
+        else:
+            SERVICE_INDEX.reindex(new)
+    elif collection == "incidents":
+        if new is None:
+            INCIDENT_INDEX.remove(key)
+        elif old is None:
+            INCIDENT_INDEX.add(new)
+        else:
+            INCIDENT_INDEX.reindex(new)
+    SUMMARY.apply(collection, old, new)
+    RECORD_JSON.discard(collection, key)
+    VERSIONS.bump(collection, key, version=seq)
+    if collection == "operations":
+        OPERATION_WATCHERS.notify(key)
+
+
+def _seed_changes():
+    """The demo data set as store changes (written once per backend).
+
+    SEED_SERVICES / SEED_INCIDENTS / SEED_LOG_LINES size it (e.g. for
+    bench.py); SEED_RANDOM fixes the RNG seed and SEED_NOW (epoch seconds)
+    the clock, for an identical data set on every run.
+    """
+    generator = DataGenerator(seed=os.environ.get("SEED_RANDOM"), now=os.environ.get("SEED_NOW"))
+    log_lines = os.environ.get("SEED_LOG_LINES")
+    services_data = generator.services(int(os.environ.get("SEED_SERVICES", 150)))
+    incidents_data = generator.incidents(services_data, int(os.environ.get("SEED_INCIDENTS", 50)))
+    log.debug("generated %d services and %d incidents", len(services_data), len(incidents_data))
+    for service in services_data:
+        yield "services", service["id"], PUT, service
+        for row in generator.log_rows(service, int(log_lines) if log_lines else None):
+            yield LOG_COLLECTION, service["id"], APPEND, row
+    for incident in incidents_data:
+        yield "incidents", incident["id"], PUT, incident
+
+
+def _bootstrap():
+    with LOGS.loading(), SERVICE_INDEX.loading(), INCIDENT_INDEX.loading():
+        STORE.bootstrap(_seed_changes)
+    # Follow other workers' writes from boot (watchers rely on it), not
+    # from the first request.
+    STORE.start_sync()
+    if STORE.backend.shared:
+        STORE.put("workers", {"id": WORKER_ID, "seen": int(time.time())})
+        threading.Thread(target=_heartbeat_loop, name="worker-heartbeat", daemon=True).start()
+    _reap_operations()
+    SEEDED.set()
+    log.info("loaded %d services", len(SERVICES))
+
+
+def _reap_operations():
+    """Fail unfinished operations whose worker is gone.
+
+    Their executor jobs died with it. With a single-process backend that is
+    every worker but this one (they were earlier runs); on a shared backend
+    it is any worker without a heartbeat in WORKER_TIMEOUT_SECONDS.
+    """
+    live = {WORKER_ID}
+    cutoff = time.time() - WORKER_TIMEOUT_SECONDS
+    if STORE.backend.shared:
+        live.update(w["id"] for w in STORE.view("workers") if w["seen"] >= cutoff)
+    for op in STORE.view("operations"):
+        if op.status not in ("pending", "running") or op.get("worker") in live:
+            continue
+        if STORE.backend.shared and op.updated_at >= cutoff:
+            continue  # its worker may be starting up and not have beaten yet
+        try:
+            update_operation(op.id, expect={"status": ("pending", "running")}, status="failed",
+                             metadata={**op.metadata, "error": "interrupted by restart"})
+        except Conflict:
+            continue
+
+
+def _heartbeat_loop():
+    """Keep this worker's heartbeat fresh and clean up after dead ones."""
+    while True:
+        time.sleep(WORKER_HEARTBEAT_SECONDS)
+        try:
+            STORE.put("workers", {"id": WORKER_ID, "seen": int(time.time())})
+            _reap_operations()
+            cutoff = time.time() - WORKER_TIMEOUT_SECONDS
+            for worker in STORE.view("workers"):
+                if worker["seen"] < cutoff:
+                    STORE.delete("workers", worker["id"])
+        except Exception:
+            log.exception("worker heartbeat failed")
+
+
+STORE.subscribe(_apply_change)
+STORE.backend.set_state_source(lambda: STORE.capture(LOGS.export))
+if SEED_LAZY:
+    # Serve (healthz at least) right away and load the data set behind it;
+    # until then other requests wait on the store or see it partly loaded.
+    threading.Thread(target=_bootstrap, name="store-bootstrap", daemon=True).start()
+else:
+    _bootstrap()
 
 # ----------------------------------------------------------------------
 #  Helpers & Middleware
 # ----------------------------------------------------------------------
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.before_request
+def start_profiling():
+    """Start the process sampler (per worker) and, if asked, profile this request."""
+    PROCESS_SAMPLER.start()
+    wanted = request.headers.get("X-Profile") == "1" or request.args.get("profile") not in (None, "", "0")
+    if wanted and request.headers.get("X-API-Key") == API_KEY:
+        g.profile = REQUEST_PROFILER.start(f"{request.method} {request.path}")
+
+
+@app.teardown_request
+def stop_profiling(_exc):
+    # Normally finished in `attach_profile_id`; this covers aborted requests.
+    handle = g.pop("profile", None)
+    if handle is not None:
+        REQUEST_PROFILER.stop(handle)
+
+
 @app.before_request
 def add_request_id():
     """Create a request ID for every request (used in error payloads)."""
     g.request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
 
 
+@app.before_request
+def sync_store():
+    """Catch up with other workers' writes (shared backends only).
+
+    Every request, reads included, applies what other workers committed
+    before it arrived, so a worker never answers 404 or stale state for a
+    write another worker has already acknowledged. When nothing is new
+    this is one feed query and takes no lock.
+    """
+    if STORE.backend.shared:
+        STORE.sync()
+
+
+# Registered first so it runs last and sees the final (compressed) response.
+@app.after_request
+def record_request_metrics(resp):
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    labels = (("method", request.method), ("route", route))
+    METRICS.inc("http_requests_total", labels + (("status", str(resp.status_code)),))
+    METRICS.observe("http_request_duration_seconds", labels,
+                    time.perf_counter() - g.request_started)
+    if resp.content_length is not None:
+        METRICS.observe("http_response_size_bytes", labels, resp.content_length)
+    return resp
+
+
+@app.after_request
+def attach_profile_id(resp):
+    handle = g.pop("profile", None)
+    if handle is not None:
+        resp.headers["X-Profile-Id"] = REQUEST_PROFILER.stop(handle)
+    return resp
+
+
 @app.after_request
 def add_request_id_header(resp):
     resp.headers["X-Request-ID"] = g.request_id
     return resp
 
 
+@app.after_request
+def compress_response(resp):
+    """Compress JSON responses for clients that accept it.
+
+    Handlers that serve cached bodies compress them up front (see
+    `cached_response`); everything else is compressed here, and streamed
+    bodies chunk by chunk. Each encoding gets its own ETag.
+    """
+    if resp.mimetype != app.json.mimetype or resp.status_code < 200 or resp.status_code in (204, 304):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encoding = resp.headers.get("Content-Encoding")
+    if encoding is None:
+        encoding = COMPRESSION.negotiate(request.accept_encodings)
+        if encoding is None:
+            return resp
+        if resp.is_streamed:
+            resp.response = COMPRESSION.stream(resp.response, encoding)
+            resp.headers.pop("Content-Length", None)
+        else:
+            body = resp.get_data()
+            if len(body) < COMPRESSION.min_bytes:
+                return resp
+            resp.set_data(COMPRESSION.compress(body, encoding))
+        resp.headers["Content-Encoding"] = encoding
+    etag, weak = resp.get_etag()
+    if etag:
+        resp.set_etag(f"{etag}+{encoding}", weak)
+    return resp
+
+
 @app.after_request
 def allow_iframe_embedding(resp):
     resp.headers.remove("X-Frame-Options")
@@ -88,6 +452,16 @@ def bad_request(e):
     return error_response(400, "Bad request", details=str(e))
 
 
+@app.errorhandler(QueueFull)
+def queue_full(e):
+    resp, status = error_response(
+        503, "Operation queue is full, retry later",
+        details={"queue_depth": e.depth, "capacity": e.capacity},
+    )
+    resp.headers["Retry-After"] = "1"
+    return resp, status
+
+
 @app.errorhandler(Exception)
 def internal_error(e):
     # In a real system you would log the exception with g.request_id
@@ -105,20 +479,99 @@ def require_api_key(fn):
     return wrapper
 
 
-def paginate(items):
-    """Return a slice of `items` based on query params `page` and `per_page`."""
+def page_params():
+    """Read `page` and `per_page` query params, clamped to sane bounds."""
     page = max(int(request.args.get("page", 1)), 1)
     per_page = min(max(int(request.args.get("per_page", 20)), 1), 100)
-    total = len(items)
-    start = (page - 1) * per_page
-    end = start + per_page
-    meta = {
-        "page": page,
-        "per_page": per_page,
-        "total": total,
-        "total_pages": (total + per_page - 1) // per_page,
-    }
-    return items[start:end], meta
+    return page, per_page
+
+
+def page_meta(page, per_page, total, next_cursor=None):
+    """Pagination metadata; `page` and `total` are None when not applicable."""
+    meta = {"per_page": per_page, "next_cursor": next_cursor}
+    if page is not None:
+        meta["page"] = page
+    if total is not None:
+        meta["total"] = total
+        if page is not None:
+            meta["total_pages"] = (total + per_page - 1) // per_page
+    return meta
+
+
+def include_total(default):
+    """Whether the caller wants an exact `total` (it may force a full scan)."""
+    value = request.args.get("include_total")
+    if value is None:
+        return default
+    return value.lower() == "true"
+
+
+def encode_cursor(scope, key):
+    """Opaque keyset cursor: the sort key of the last row a page returned."""
+    raw = json.dumps([scope, list(key)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, scope):
+    """Inverse of `encode_cursor`; raises ValueError for foreign or corrupt cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_scope, key = json.loads(raw)
+    except Exception as exc:
+        raise ValueError("malformed cursor") from exc
+    if cursor_scope != scope or not isinstance(key, list):
+        raise ValueError("cursor does not belong to this listing")
+    return tuple(key)
+
+
+def record_body(collection, record):
+    """`{"data": record}` as bytes, reusing the record's cached encoding."""
+    return b'{"data":' + RECORD_JSON.encode(collection, record) + b"}\n"
+
+
+def json_response(body, status=200):
+    """Wrap pre-serialized JSON bytes in a response."""
+    return Response(body, status=status, mimetype=app.json.mimetype)
+
+
+def not_modified(etag):
+    """A bodiless 304 if the request's If-None-Match already has `etag`, else None.
+
+    Call this before building the response so unchanged data is never
+    re-serialized.
+    """
+    # Compressed variants carry "<etag>+<encoding>"; any of them matches.
+    tags = request.if_none_match
+    if tags.star_tag or any(tag.split("+", 1)[0] == etag for tag in tags.as_set()):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    return None
+
+
+def with_etag(resp, etag):
+    resp.set_etag(etag)
+    return resp
+
+
+def cached_response(collection, version, cache_key, body, etag):
+    """Respond with a RESPONSE_CACHE body, compressed once per encoding.
+
+    The compressed variant is cached next to the body under the same
+    version, so hot responses are compressed once, not on every request.
+    """
+    encoding = None
+    if len(body) >= COMPRESSION.min_bytes:
+        encoding = COMPRESSION.negotiate(request.accept_encodings)
+    if encoding is None:
+        return with_etag(json_response(body), etag)
+    variant = RESPONSE_CACHE.get(collection, version, (cache_key, encoding))
+    if variant is None:
+        variant = COMPRESSION.compress(body, encoding)
+        RESPONSE_CACHE.put(collection, version, (cache_key, encoding), variant)
+    resp = json_response(variant)
+    resp.headers["Content-Encoding"] = encoding
+    return with_etag(resp, etag)
 
 
 def as_list(value):
@@ -133,68 +586,199 @@ def as_list(value):
 # ----------------------------------------------------------------------
 #  Async operation simulation
 # ----------------------------------------------------------------------
-def create_operation(op_type, target_type, target_id, metadata=None):
-    """Create an operation record and run a background thread to simulate work."""
-    op_id = f"op-{uuid.uuid4().hex[:8]}"
-    OPERATIONS[op_id] = {
-        "id": op_id,
+def operation_record(op_type, target_type, target_id, metadata=None, **extra):
+    """A new pending operation record (not stored yet)."""
+    return {
+        "id": f"op-{uuid.uuid4().hex[:8]}",
         "type": op_type,
         "target_type": target_type,
         "target_id": target_id,
         "status": "pending",
-        "created_at": now_iso(),
-        "updated_at": now_iso(),
+        "created_at": int(time.time()),
+        "updated_at": int(time.time()),
         "metadata": metadata or {},
+        "worker": WORKER_ID,
+        **extra,
     }
-    thread = threading.Thread(target=_simulate_operation, args=(op_id,), daemon=True)
-    thread.start()
+
+
+def create_operation(op_type, target_type, target_id, metadata=None):
+    """Create an operation record and queue its simulation on EXECUTOR.
+
+    An unfinished operation of the same type against the same target is
+    superseded by the new one (e.g. two scales in a row only apply the
+    last): a pending one never starts and a running one stops at its next
+    step; either is marked cancelled with `superseded_by`. Raises QueueFull
+    when the executor is at capacity.
+    """
+    op_id = STORE.put("operations", operation_record(op_type, target_type, target_id, metadata))["id"]
+    try:
+        start_operation(op_id, delay=0.3)
+    except QueueFull:
+        STORE.delete("operations", op_id)
+        raise
     return OPERATIONS[op_id]
 
 
+def start_operation(op_id, delay=0.0):
+    """Submit a stored pending operation to EXECUTOR (may raise QueueFull)."""
+    op = OPERATIONS[op_id]
+    superseded = EXECUTOR.submit(
+        op_id, _simulate_operation(op_id), key=(op["target_id"], op["type"]), delay=delay
+    )
+    if superseded:
+        old = OPERATIONS[superseded]
+        try:
+            # Unless it finished in the meantime (its last step was running).
+            update_operation(superseded, expect={"status": ("pending", "running")}, status="cancelled",
+                             metadata={**old["metadata"], "superseded_by": op_id})
+        except Conflict:
+            return
+        record_operation(old["type"], "cancelled")
+
+
+def record_operation(op_type, status, started=None):
+    """Count a finished operation and, if it ran, how long it took."""
+    labels = (("type", op_type), ("status", status))
+    METRICS.inc("operations_total", labels)
+    if started is not None:
+        METRICS.observe("operation_duration_seconds", labels, time.monotonic() - started)
+
+
+def validate_operation(op_type, metadata):
+    """Check an operation's type and metadata; returns an error message or None."""
+    if op_type not in OPERATION_TYPES:
+        return f"type must be one of {', '.join(OPERATION_TYPES)}"
+    if op_type == "scale":
+        if metadata.get("replicas") is None:
+            return "replicas field is required"
+        if isinstance(metadata["replicas"], bool):
+            return "replicas must be an integer"
+        try:
+            replicas = int(metadata["replicas"])
+        except (TypeError, ValueError):
+            return "replicas must be an integer"
+        if not 0 <= replicas <= MAX_REPLICAS:
+            return f"replicas must be between 0 and {MAX_REPLICAS}"
+    if op_type == "deploy" and not metadata.get("version"):
+        return "version field is required"
+    return None
+
+
+def batch_progress(children):
+    """Count a batch's children by status."""
+    counts = Counter(OPERATIONS[cid]["status"] for cid in children if cid in OPERATIONS)
+    progress = {status: counts.get(status, 0)
+                for status in ("pending", "running") + TERMINAL_OPERATION_STATUSES}
+    progress["total"] = len(children)
+    return progress
+
+
+def _run_batch(batch_id):
+    """Release a batch's children onto EXECUTOR within its limits.
+
+    Runs as an EXECUTOR job itself. At most ``concurrency`` children are in
+    flight at once, and at most ``max_unavailable`` of those may be
+    disruptive. Children go out in order; one that doesn't fit waits for a
+    slot rather than being skipped. Aggregated progress is written to the
+    batch record whenever it changes, so one GET shows the whole rollout.
+    """
+    batch = OPERATIONS.get(batch_id)
+    if not batch:
+        return
+    concurrency = batch["metadata"]["concurrency"]
+    max_unavailable = batch["metadata"]["max_unavailable"]
+    queued = deque(batch["children"])
+    active = []
+    started = time.monotonic()
+    update_operation(batch_id, status="running")
+
+    while True:
+        active = [cid for cid in active
+                  if OPERATIONS[cid]["status"] not in TERMINAL_OPERATION_STATUSES]
+        unavailable = sum(1 for cid in active if OPERATIONS[cid]["type"] in DISRUPTIVE_OPERATION_TYPES)
+        while queued and len(active) < concurrency:
+            child = OPERATIONS[queued[0]]
+            disruptive = child["type"] in DISRUPTIVE_OPERATION_TYPES
+            if child["status"] != "pending":
+                queued.popleft()  # e.g. cancelled before its turn
+                continue
+            if disruptive and unavailable >= max_unavailable:
+                break
+            try:
+                start_operation(child["id"])
+            except QueueFull:
+                break  # try again next tick
+            queued.popleft()
+            active.append(child["id"])
+            unavailable += disruptive
+
+        progress = batch_progress(batch["children"])
+        if not queued and not active:
+            break
+        if progress != OPERATIONS[batch_id].get("progress"):
+            update_operation(batch_id, progress=progress)
+        yield BATCH_POLL_SECONDS
+
+    status = "failed" if progress["failed"] else "succeeded"
+    update_operation(batch_id, status=status, progress=progress)
+    record_operation("batch", status, started)
+
+
 def _simulate_operation(op_id):
-    """Simple state machine: pending -> running -> succeeded/failed."""
+    """Simple state machine: pending -> running -> succeeded/failed.
+
+    Runs as an EXECUTOR job: the executor waits out the pending delay, and
+    every `yield` hands the worker back for that many seconds.
+    """
     op = OPERATIONS.get(op_id)
     if not op:
         return
 
     # ---- pending -> running ----
-    time.sleep(0.3)
-    op["status"] = "running"
-    op["updated_at"] = now_iso()
-    time.sleep(1.0)
+    started = time.monotonic()
+    try:
+        update_operation(op_id, expect={"status": ("pending",)}, status="running")
+    except Conflict:
+        return  # superseded (cancelled) before it started
+    yield 1.0
 
     # ---- do the work (very naive) ----
     try:
         svc = SERVICES.get(op["target_id"])
         if op["type"] == "restart" and svc:
-            LOGS[svc["id"]].append(f"{now_iso()} INFO restart requested")
-            time.sleep(0.4)
-            svc["status"] = "healthy"
-            LOGS[svc["id"]].append(f"{now_iso()} INFO service restarted status=healthy")
+            append_log(svc["id"], "INFO", "restart requested")
+            yield 0.4
+            update_service(svc["id"], status="healthy")
+            append_log(svc["id"], "INFO", "service restarted status=healthy")
 
         elif op["type"] == "scale" and svc:
             replicas = int(op["metadata"].get("replicas", svc["replicas"]))
-            svc["desired_replicas"] = replicas
-            LOGS[svc["id"]].append(f"{now_iso()} INFO scaling to replicas={replicas}")
-            time.sleep(0.5)
-            svc["replicas"] = replicas
-            LOGS[svc["id"]].append(f"{now_iso()} INFO scale complete replicas={replicas}")
+            update_service(svc["id"], desired_replicas=replicas)
+            append_log(svc["id"], "INFO", f"scaling to replicas={replicas}")
+            yield 0.5
+            update_service(svc["id"], replicas=replicas)
+            append_log(svc["id"], "INFO", f"scale complete replicas={replicas}")
 
         elif op["type"] == "deploy" and svc:
             version = op["metadata"].get("version", svc["version"])
-            LOGS[svc["id"]].append(f"{now_iso()} INFO deploying version={version}")
-            time.sleep(0.6)
-            svc["version"] = version
-            svc["last_deploy_at"] = now_iso()
-            LOGS[svc["id"]].append(f"{now_iso()} INFO deploy complete version={version}")
-
-        op["status"] = "succeeded"
+            append_log(svc["id"], "INFO", f"deploying version={version}")
+            yield 0.6
+            update_service(svc["id"], version=version, last_deploy_at=int(time.time()))
+            append_log(svc["id"], "INFO", f"deploy complete version={version}")
+
+        # Compare-and-set, so a supersede that landed meanwhile wins.
+        update_operation(op_id, expect={"status": ("running",)}, status="succeeded")
+        record_operation(op["type"], "succeeded", started)
+    except Conflict:
+        pass
     except Exception as exc:
-        op["status"] = "failed"
-        op["metadata"]["error"] = str(exc)
-
-    finally:
-        op["updated_at"] = now_iso()
+        try:
+            update_operation(op_id, expect={"status": ("running",)}, status="failed",
+                             metadata={**op["metadata"], "error": str(exc)})
+        except Conflict:
+            return
+        record_operation(op["type"], "failed", started)
 
 
 # ----------------------------------------------------------------------
@@ -203,7 +787,84 @@ def _simulate_operation(op_id):
 @app.get("/v1/healthz")
 def healthz():
     """Simple health check endpoint."""
-    return jsonify({"status": "ok", "time": now_iso()})
+    return jsonify({"status": "ok", "time": now_iso(), "seeded": SEEDED.is_set()})
+
+
+def _collect_state_metrics():
+    """Register scrape-time readers for state that is already tracked elsewhere."""
+    def queue_stats():
+        stats = EXECUTOR.stats()
+        return [((("state", state),), stats[state]) for state in ("in_flight", "scheduled", "ready")]
+
+    def log_stats(field):
+        return lambda: [((), LOGS.stats()[field])]
+
+    def cache_stats(field):
+        return lambda: [((), RESPONSE_CACHE.stats()[field])]
+
+    def compression_stats(field):
+        return lambda: [((("encoding", encoding),), stats[field])
+                        for encoding, stats in COMPRESSION.stats()["encodings"].items()]
+
+    collectors = [
+        ("operation_queue_depth", "gauge", "Operations on the executor by state.", queue_stats),
+        ("operation_queue_capacity", "gauge", "Executor admission limit.",
+         lambda: [((), EXECUTOR.capacity)]),
+        ("longpoll_waiters", "gauge", "Requests parked in long-poll waits.",
+         lambda: [((), OPERATION_WATCHERS.stats()["blocked"])]),
+        ("store_records", "gauge", "Records held per collection.",
+         lambda: [((("collection", name),), len(records))
+                  for name, records in STORE.collections.items()]),
+        ("store_seq", "gauge", "Last change-feed sequence number applied.", lambda: [((), STORE.seq)]),
+        ("logs_retained_lines", "gauge", "Log lines held in memory.", log_stats("lines")),
+        ("logs_retained_bytes", "gauge", "Log message bytes held in memory.", log_stats("bytes")),
+        ("logs_services", "gauge", "Services with a log buffer.", log_stats("services")),
+        ("logs_subscribers", "gauge", "Open log streams.", log_stats("subscribers")),
+        ("logs_index_postings", "gauge", "Word postings in the log search index.",
+         lambda: [((), LOGS.stats()["index"]["postings"])]),
+        ("response_cache_bytes", "gauge", "Bytes held by the response cache.", cache_stats("bytes")),
+        ("response_cache_hits_total", "counter", "Response cache hits.", cache_stats("hits")),
+        ("response_cache_misses_total", "counter", "Response cache misses.", cache_stats("misses")),
+        ("response_cache_evictions_total", "counter", "Response cache LRU evictions.",
+         cache_stats("evictions")),
+        ("compression_cpu_seconds_total", "counter", "Thread CPU time spent compressing.",
+         compression_stats("cpu_seconds")),
+        ("compression_input_bytes_total", "counter", "Bytes before compression.",
+         compression_stats("bytes_in")),
+        ("compression_output_bytes_total", "counter", "Bytes after compression.",
+         compression_stats("bytes_out")),
+    ]
+    for name, kind, help, fn in collectors:
+        METRICS.collector(name, kind, help, fn)
+
+
+_collect_state_metrics()
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of METRICS (per worker process)."""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+# -------------------- Summary --------------------
+@app.get("/v1/summary")
+@require_api_key
+def get_summary():
+    """Service counts by status/owner and incident counts by status/severity.
+
+    Served from counters kept up to date on every change, so the cost does
+    not grow with the fleet.
+    """
+    # The clock is shared, so the newer of the two versions identifies the
+    # state of both collections. Read it before the counters: a change in
+    # between only makes the ETag older than the body, never newer.
+    version = max(VERSIONS.get("services"), VERSIONS.get("incidents"))
+    etag = VERSIONS.etag("summary", version=version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify({"data": SUMMARY.snapshot()}), etag)
 
 
 # -------------------- Services --------------------
@@ -219,50 +880,306 @@ def list_services():
     order = request.args.get("order", "asc")
     reverse = order == "desc"
 
-    items = list(SERVICES.values())
-
+    version = VERSIONS.get("services")
+    etag = VERSIONS.etag("services", version=version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    page, per_page = page_params()
+    cursor = request.args.get("cursor")
+    count = include_total(default=not cursor)
+    cache_key = ("list", q, tuple(sorted(statuses)), tuple(sorted(owners)),
+                 SERVICE_INDEX.sort_field(sort), reverse, page, per_page, cursor, count)
+    body = RESPONSE_CACHE.get("services", version, cache_key)
+    if body is not None:
+        return cached_response("services", version, cache_key, body, etag)
+
+    match = None
     if q:
-        items = [s for s in items if q in s["id"].lower() or q in s["name"].lower()]
-    if statuses:
-        items = [s for s in items if s["status"] in statuses]
-    if owners:
-        items = [s for s in items if s["owner"] in owners]
-
-    # Simple sorting
-    key_func = lambda s: s.get(sort, "")
-    items.sort(key=key_func, reverse=reverse)
+        def match(sid):
+            return q in sid.lower() or q in SERVICES[sid]["name"].lower()
+
+    # Filters and ordering are answered from SERVICE_INDEX, so a page only
+    # touches the matching ids instead of copying and sorting every service.
+    scope = f"services:{SERVICE_INDEX.sort_field(sort)}:{order}"
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, scope)
+        except ValueError as exc:
+            return error_response(400, "Invalid cursor", details=str(exc))
+        page = None
 
-    page_items, meta = paginate(items)
-    return jsonify({"data": page_items, "meta": meta})
+    try:
+        ids, total = SERVICE_INDEX.query(
+            statuses=statuses,
+            owners=owners,
+            sort=sort,
+            reverse=reverse,
+            match=match,
+            offset=0 if cursor else (page - 1) * per_page,
+            limit=per_page + 1,
+            after=after,
+            count=count,
+        )
+    except TypeError:
+        return error_response(400, "Invalid cursor")
+    ids, has_more = ids[:per_page], len(ids) > per_page
+    page_items = [SERVICES[sid] for sid in ids]
+
+    next_cursor = encode_cursor(scope, SERVICE_INDEX.sort_key(ids[-1], sort)) if has_more else None
+    body = envelope(RECORD_JSON.array("services", page_items),
+                    page_meta(page, per_page, total, next_cursor))
+    RESPONSE_CACHE.put("services", version, cache_key, body)
+    return cached_response("services", version, cache_key, body, etag)
 
 @app.get("/v1/services/count")
 @require_api_key
 def get_services_count():
-    print(f"DEBUG: Count endpoint called, SERVICES has {len(SERVICES)} items")
     return jsonify({"data": len(SERVICES)})
 
 @app.get("/v1/services/<sid>")
 @require_api_key
 def get_service(sid):
+    """A service; `include=incidents` adds its unresolved incident counts."""
     svc = SERVICES.get(sid)
     if not svc:
         return error_response(404, "Service not found")
-    return jsonify({"data": svc})
+    if "incidents" not in as_list(request.args.get("include")):
+        etag = VERSIONS.etag("services", sid)
+        return not_modified(etag) or with_etag(json_response(record_body("services", svc)), etag)
+    # The counts come from INCIDENT_INDEX and are spliced onto the cached
+    # record encoding; any incident change moves the ETag (versions share
+    # one clock, so the larger of the two is a valid version).
+    version = max(VERSIONS.get("services", sid), VERSIONS.get("incidents"))
+    etag = VERSIONS.etag("services", f"{sid}.incidents", version=version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    counts = json.dumps(INCIDENT_INDEX.open_counts(sid), separators=(",", ":")).encode()
+    body = (b'{"data":' + RECORD_JSON.encode("services", svc)[:-1]
+            + b',"open_incidents":' + counts + b"}}\n")
+    return with_etag(json_response(body), etag)
 
 
 @app.get("/v1/services/<sid>/logs")
 @require_api_key
 def get_service_logs(sid):
+    """A service's log lines by count (head, `tail=true` or `cursor`).
+
+    `since` (inclusive) / `until` (exclusive) ISO-8601 timestamps and
+    `level` (comma-separated) select lines by time and level instead; see
+    `_service_log_window`.
+    """
     if sid not in SERVICES:
         return error_response(404, "Service not found")
     limit = int(request.args.get("limit", 100))
     tail = request.args.get("tail", "false").lower() == "true"
-    logs = LOGS.get(sid, [])
-    if tail:
-        logs = logs[-limit:]
+    cursor = request.args.get("cursor")
+    first, end = LOGS.bounds(sid)
+    etag = VERSIONS.etag("logs", sid, version=end)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    if any(request.args.get(name) for name in ("since", "until", "level")):
+        return _service_log_window(sid, limit, tail, cursor, etag)
+    # Every line has a sequence number that survives ring-buffer eviction,
+    # so it is a stable keyset cursor: following one returns exactly the
+    # lines written since (or the oldest retained, if it was evicted).
+    if cursor:
+        try:
+            (start,) = decode_cursor(cursor, f"logs:{sid}")
+            start = min(max(int(start), first), end)
+        except (TypeError, ValueError) as exc:
+            return error_response(400, "Invalid cursor", details=str(exc))
+    elif tail:
+        start = max(end - limit, first)
     else:
-        logs = logs[:limit]
-    return jsonify({"data": logs, "meta": {"count": len(logs), "total": len(LOGS.get(sid, []))}})
+        start = first
+    if limit > LOG_STREAM_LINES:
+        return with_etag(_stream_log_lines(sid, start, start + limit, end - first), etag)
+    logs = LOGS.lines(sid, start, start + limit)
+    meta = {
+        "count": len(logs),
+        "total": end - first,
+        "next_cursor": encode_cursor(f"logs:{sid}", [start + len(logs)]),
+    }
+    return with_etag(jsonify({"data": logs, "meta": meta}), etag)
+
+
+def _service_log_window(sid, limit, tail, cursor, etag):
+    """Lines of one service in a time window, oldest first.
+
+    Served from the log index: the service's per-level posting lists are
+    binary-searched to the window and merged, so a page costs O(log n +
+    limit) even over millions of lines. `limit` is clamped to 1..1000, as
+    in `search_logs`; `tail=true` returns the window's last `limit` lines.
+    The cursor is the `(ts, seq)` of the last line returned; following it
+    continues the window (and, with no `until`, picks up lines written
+    since). There is no `total`, since counting a window would mean
+    visiting all of it.
+    """
+    levels = [level.upper() for level in as_list(request.args.get("level"))]
+    unknown = [level for level in levels if level not in LEVEL_CODES]
+    if unknown:
+        return error_response(400, "Unknown log level", details=unknown)
+    try:
+        since = parse_iso(request.args["since"]) if request.args.get("since") else None
+        until = parse_iso(request.args["until"]) if request.args.get("until") else None
+    except ValueError as exc:
+        return error_response(400, "Invalid since or until", details=str(exc))
+    scope = f"logs:{sid}:window"
+    after = None
+    if cursor:
+        try:
+            ts, seq = decode_cursor(cursor, scope)
+            after = (int(ts), sid, int(seq))
+        except (TypeError, ValueError) as exc:
+            return error_response(400, "Invalid cursor", details=str(exc))
+    hits = LOGS.search(levels=levels, sids=[sid], since=since, until=until, after=after,
+                       limit=min(max(limit, 1), 1000), reverse=tail and after is None)
+    if tail and after is None:
+        hits.reverse()
+    last = hits[-1][:3] if hits else after
+    meta = {
+        "count": len(hits),
+        "next_cursor": encode_cursor(scope, [last[0], last[2]]) if last else None,
+    }
+    return with_etag(jsonify({"data": [line for _, _, _, line in hits], "meta": meta}), etag)
+
+
+def _stream_log_lines(sid, start, stop, total):
+    """A large log page, read and sent LOG_STREAM_LINES at a time.
+
+    Same body as the buffered path, but only one chunk of lines is ever
+    held in memory and the first bytes go out right away.
+    """
+    position, count = start, 0
+
+    def lines():
+        nonlocal position, count
+        for chunk_start in range(start, stop, LOG_STREAM_LINES):
+            chunk = LOGS.entries(sid, max(chunk_start, position),
+                                 min(chunk_start + LOG_STREAM_LINES, stop))
+            for seq, line in chunk:
+                position, count = seq + 1, count + 1
+                yield line
+            if not chunk:
+                return
+
+    def meta():
+        return {
+            "count": count,
+            "total": total,
+            "next_cursor": encode_cursor(f"logs:{sid}", [position]),
+        }
+
+    return Response(iter_envelope(lines(), meta), mimetype=app.json.mimetype)
+
+
+@app.get("/v1/logs/search")
+@require_api_key
+def search_logs():
+    """Search log lines across services, oldest first, with cursor paging.
+
+    `q` matches whole words plus the phrase itself; `level` and
+    `service_id` take comma-separated lists; `since` (inclusive) and
+    `until` (exclusive) are ISO-8601 timestamps. Without `q`, several
+    `service_id`s give one merged timeline of those services over the
+    window (e.g. everything around an incident).
+    """
+    q = request.args.get("q", "").strip()
+    levels = [level.upper() for level in as_list(request.args.get("level"))]
+    sids = as_list(request.args.get("service_id"))
+    unknown = [level for level in levels if level not in LEVEL_CODES]
+    if unknown:
+        return error_response(400, "Unknown log level", details=unknown)
+    try:
+        limit = min(max(int(request.args.get("limit", 100)), 1), 1000)
+        since = parse_iso(request.args["since"]) if request.args.get("since") else None
+        until = parse_iso(request.args["until"]) if request.args.get("until") else None
+    except ValueError as exc:
+        return error_response(400, "Invalid limit, since or until", details=str(exc))
+    after = None
+    if request.args.get("cursor"):
+        try:
+            ts, sid, seq = decode_cursor(request.args["cursor"], "logs:search")
+            after = (int(ts), str(sid), int(seq))
+        except (TypeError, ValueError) as exc:
+            return error_response(400, "Invalid cursor", details=str(exc))
+
+    hits = LOGS.search(q, levels=levels, sids=sids, since=since, until=until,
+                       after=after, limit=limit + 1)
+    hits, has_more = hits[:limit], len(hits) > limit
+    data = [{"service_id": sid, "seq": seq, "ts": format_iso(ts), "line": line}
+            for ts, sid, seq, line in hits]
+    next_cursor = encode_cursor("logs:search", hits[-1][:3]) if has_more else None
+    return jsonify({"data": data, "meta": {"count": len(data), "next_cursor": next_cursor}})
+
+
+@app.get("/v1/services/<sid>/logs/stream")
+@require_api_key
+def stream_service_logs(sid):
+    """Follow a service's logs as Server-Sent Events.
+
+    Resumes after `Last-Event-ID` (header or `last_event_id` param) when
+    given, otherwise starts with the last `tail` lines (default 0). Each
+    event id is the line's sequence number. At most LOG_FOLLOWERS_MAX
+    streams are open per worker; beyond that the answer is 503.
+    """
+    if sid not in SERVICES:
+        return error_response(404, "Service not found")
+    resume = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        tail = max(int(request.args.get("tail", 0)), 0)
+        resume = int(resume) + 1 if resume else None
+    except ValueError:
+        return error_response(400, "Last-Event-ID and tail must be integers")
+    if not LOG_FOLLOWERS.acquire(blocking=False):
+        resp, status = error_response(503, "Too many log followers, retry later")
+        resp.headers["Retry-After"] = "5"
+        return resp, status
+
+    def generate():
+        sub, end = LOGS.subscribe(sid)
+        position = resume if resume is not None else end - tail
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        try:
+            yield sse_retry(1000)
+            # Backlog from the buffer; anything newer arrives via `sub`.
+            for seq, line in LOGS.entries(sid, position, end):
+                yield sse_frame(line, event="log", event_id=seq)
+                position = seq + 1
+            position = max(position, end)
+            while time.monotonic() < deadline:
+                try:
+                    event = sub.queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield sse_comment("keepalive")
+                    continue
+                if sub.overflowed:
+                    # We fell behind the inbox; re-read the gap from the buffer.
+                    sub.overflowed = False
+                    _, newest = LOGS.bounds(sid)
+                    for seq, line in LOGS.entries(sid, position, newest):
+                        yield sse_frame(line, event="log", event_id=seq)
+                    position = max(position, newest)
+                if event.seq >= position:
+                    yield event.frame
+                    position = event.seq + 1
+        finally:
+            LOGS.unsubscribe(sid, sub)
+
+    resp = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Released when the server closes the response, even if the stream
+    # never started (client gone before the first byte).
+    resp.call_on_close(LOG_FOLLOWERS.release)
+    return resp
 
 
 @app.post("/v1/services/<sid>/restart")
@@ -280,14 +1197,10 @@ def scale_service(sid):
     if sid not in SERVICES:
         return error_response(404, "Service not found")
     payload = request.get_json(silent=True) or {}
-    replicas = payload.get("replicas")
-    if replicas is None:
-        return error_response(400, "replicas field is required")
-    try:
-        replicas = int(replicas)
-    except ValueError:
-        return error_response(400, "replicas must be an integer")
-    op = create_operation("scale", "service", sid, {"replicas": replicas})
+    error = validate_operation("scale", payload)
+    if error:
+        return error_response(400, error)
+    op = create_operation("scale", "service", sid, {"replicas": int(payload["replicas"])})
     return jsonify({"data": op}), 202
 
 
@@ -312,18 +1225,51 @@ def list_incidents():
     status = set(as_list(request.args.get("status")))
     severity = set(as_list(request.args.get("severity")))
     service_id = request.args.get("service_id")
-    items = list(INCIDENTS.values())
-
-    if status:
-        items = [i for i in items if i["status"] in status]
-    if severity:
-        items = [i for i in items if i["severity"] in severity]
-    if service_id:
-        items = [i for i in items if i["service_id"] == service_id]
+    version = VERSIONS.get("incidents")
+    etag = VERSIONS.etag("incidents", version=version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    page, per_page = page_params()
+    cursor = request.args.get("cursor")
+    count = include_total(default=not cursor)
+    cache_key = ("list", tuple(sorted(status)), tuple(sorted(severity)), service_id,
+                 page, per_page, cursor, count)
+    body = RESPONSE_CACHE.get("incidents", version, cache_key)
+    if body is not None:
+        return cached_response("incidents", version, cache_key, body, etag)
+
+    # Most severe (by rank, not alphabetically) and newest first, answered
+    # from INCIDENT_INDEX so a page only touches the matching ids.
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, "incidents")
+        except ValueError as exc:
+            return error_response(400, "Invalid cursor", details=str(exc))
+        page = None
 
-    items.sort(key=lambda i: (i["severity"], i["created_at"]), reverse=True)
-    page_items, meta = paginate(items)
-    return jsonify({"data": page_items, "meta": meta})
+    try:
+        ids, total = INCIDENT_INDEX.query(
+            statuses=status,
+            severities=severity,
+            service_id=service_id,
+            offset=0 if cursor else (page - 1) * per_page,
+            limit=per_page + 1,
+            after=after,
+            count=count,
+        )
+    except TypeError:
+        return error_response(400, "Invalid cursor")
+    ids, has_more = ids[:per_page], len(ids) > per_page
+    page_items = [INCIDENTS[iid] for iid in ids]
+
+    next_cursor = encode_cursor("incidents", INCIDENT_INDEX.sort_key(ids[-1])) if has_more else None
+    body = envelope(RECORD_JSON.array("incidents", page_items),
+                    page_meta(page, per_page, total, next_cursor))
+    RESPONSE_CACHE.put("incidents", version, cache_key, body)
+    return cached_response("incidents", version, cache_key, body, etag)
 
 
 @app.post("/v1/incidents")
@@ -344,12 +1290,11 @@ def create_incident():
         "severity": severity,
         "status": "open",
         "title": title,
-        "created_at": now_iso(),
+        "created_at": int(time.time()),
         "acked_by": None,
         "resolved_by": None,
     }
-    INCIDENTS[inc_id] = inc
-    return jsonify({"data": inc}), 201
+    return jsonify({"data": put_incident(inc)}), 201
 
 
 @app.post("/v1/incidents/<iid>/ack")
@@ -357,13 +1302,13 @@ def create_incident():
 def ack_incident(iid):
     payload = request.get_json(silent=True) or {}
     actor = payload.get("actor", "system")
-    inc = INCIDENTS.get(iid)
-    if not inc:
-        return error_response(404, "Incident not found")
-    if inc["status"] not in ("open", "acknowledged"):
+    try:
+        inc = update_incident(iid, expect={"status": ("open", "acknowledged")},
+                              status="acknowledged", acked_by=actor)
+    except Conflict as exc:
+        if exc.current is None:
+            return error_response(404, "Incident not found")
         return error_response(409, "Incident cannot be acked in its current state")
-    inc["status"] = "acknowledged"
-    inc["acked_by"] = actor
     return jsonify({"data": inc})
 
 
@@ -372,24 +1317,234 @@ def ack_incident(iid):
 def resolve_incident(iid):
     payload = request.get_json(silent=True) or {}
     actor = payload.get("actor", "system")
-    inc = INCIDENTS.get(iid)
-    if not inc:
-        return error_response(404, "Incident not found")
-    if inc["status"] == "resolved":
+    try:
+        inc = update_incident(iid, expect={"status": ("open", "acknowledged")},
+                              status="resolved", resolved_by=actor)
+    except Conflict as exc:
+        if exc.current is None:
+            return error_response(404, "Incident not found")
         return error_response(409, "Incident already resolved")
-    inc["status"] = "resolved"
-    inc["resolved_by"] = actor
     return jsonify({"data": inc})
 
 
+# -------------------- Admin --------------------
+@app.get("/v1/admin/cache")
+@require_api_key
+def get_cache_stats():
+    """Response cache, record encoding and compression counters (e.g. for sizing
+    RESPONSE_CACHE_BYTES or tuning compression levels)."""
+    return jsonify({"data": {
+        **RESPONSE_CACHE.stats(),
+        "encoded_records": RECORD_JSON.stats(),
+        "compression": COMPRESSION.stats(),
+    }})
+
+
+@app.get("/v1/admin/profile")
+@require_api_key
+def get_process_profile():
+    """Aggregated hot paths from the process-wide sampler (this worker).
+
+    `format=collapsed` (default, for flamegraph.pl / speedscope) or
+    `format=speedscope`; `reset=1` starts a fresh aggregate afterwards.
+    """
+    reset = request.args.get("reset") == "1"
+    return _profile_response(PROCESS_SAMPLER.snapshot(reset=reset))
+
+
+@app.get("/v1/admin/profiles/<pid>")
+@require_api_key
+def get_request_profile(pid):
+    """A profiled request's samples, by the id from its `X-Profile-Id` header."""
+    profile = REQUEST_PROFILER.get(pid)
+    if profile is None:
+        return error_response(404, "Profile not found")
+    return _profile_response(profile)
+
+
+def _profile_response(profile):
+    fmt = request.args.get("format", "collapsed")
+    if fmt == "speedscope":
+        return jsonify(profile.speedscope())
+    if fmt != "collapsed":
+        return error_response(400, "format must be collapsed or speedscope")
+    return Response(profile.collapsed(), mimetype="text/plain")
+
+
 # -------------------- Operations --------------------
+@app.post("/v1/operations/batch")
+@require_api_key
+def create_batch_operation():
+    """Run restart/scale/deploy across many services as one parent operation.
+
+    The body lists ``operations`` (``{type, service_id, metadata}``) or a
+    ``selector`` (``owner`` / ``status`` / ``q``, as in ``GET /v1/services``)
+    applied with a top-level ``type`` and ``metadata``; entries without a
+    type or metadata inherit the top-level ones. ``concurrency`` (default
+    10) and ``max_unavailable`` (default: concurrency) pace the rollout.
+    Poll the returned operation for aggregated ``progress``.
+    """
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return error_response(400, "body must be an object")
+    default_type = payload.get("type")
+    default_metadata = payload.get("metadata") or {}
+    if not isinstance(default_metadata, dict):
+        return error_response(400, "metadata must be an object")
+    if any(isinstance(payload.get(field), bool) for field in ("concurrency", "max_unavailable")):
+        return error_response(400, "concurrency and max_unavailable must be integers")
+    try:
+        concurrency = int(payload.get("concurrency", 10))
+        max_unavailable = int(payload.get("max_unavailable", concurrency))
+    except (TypeError, ValueError):
+        return error_response(400, "concurrency and max_unavailable must be integers")
+    if concurrency < 1 or max_unavailable < 1:
+        return error_response(400, "concurrency and max_unavailable must be at least 1")
+
+    if "operations" in payload:
+        entries = payload["operations"]
+        if not isinstance(entries, list):
+            return error_response(400, "operations must be a list")
+    elif "selector" in payload:
+        selector = payload["selector"] or {}
+        if not isinstance(selector, dict):
+            return error_response(400, "selector must be an object")
+        for field in ("status", "owner"):
+            values = selector.get(field)
+            if values is not None and not all(isinstance(v, str) for v in
+                                              (values if isinstance(values, list) else [values])):
+                return error_response(400, f"selector.{field} must be a string or a list of strings")
+        q = str(selector.get("q", "")).lower()
+        match = None
+        if q:
+            def match(sid):
+                return q in sid.lower() or q in SERVICES[sid]["name"].lower()
+        ids, _ = SERVICE_INDEX.query(
+            statuses=set(as_list(selector.get("status"))),
+            owners=set(as_list(selector.get("owner"))),
+            sort="id",
+            match=match,
+            limit=BATCH_MAX_OPERATIONS + 1,
+            count=False,
+        )
+        entries = [{"service_id": sid} for sid in ids]
+    else:
+        return error_response(400, "operations or selector is required")
+    if not entries:
+        return error_response(400, "batch matches no services")
+    if len(entries) > BATCH_MAX_OPERATIONS:
+        return error_response(400, f"batch exceeds {BATCH_MAX_OPERATIONS} operations")
+
+    batch = operation_record("batch", "batch", None, {
+        "concurrency": concurrency,
+        "max_unavailable": max_unavailable,
+    })
+    children = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            return error_response(400, f"operations[{i}] must be an object")
+        op_type = entry.get("type", default_type)
+        metadata = entry.get("metadata") or default_metadata
+        sid = entry.get("service_id")
+        if not isinstance(metadata, dict):
+            return error_response(400, f"operations[{i}].metadata must be an object",
+                                  details={"index": i})
+        if not isinstance(sid, str):
+            return error_response(400, f"operations[{i}].service_id must be a string",
+                                  details={"index": i})
+        if sid not in SERVICES:
+            return error_response(404, "Service not found", details={"index": i, "service_id": sid})
+        error = validate_operation(op_type, metadata)
+        if error:
+            return error_response(400, error, details={"index": i})
+        children.append(operation_record(op_type, "service", sid, metadata, parent_id=batch["id"]))
+
+    batch["children"] = [child["id"] for child in children]
+    batch["progress"] = dict(batch_progress([]), pending=len(children), total=len(children))
+    # One write for the whole batch; the children are released gradually.
+    STORE.write([("operations", op["id"], PUT, op) for op in [batch] + children])
+    try:
+        EXECUTOR.submit(batch["id"], _run_batch(batch["id"]))
+    except QueueFull:
+        STORE.write([("operations", op["id"], DELETE, None) for op in [batch] + children])
+        raise
+    return jsonify({"data": OPERATIONS[batch["id"]]}), 202
+
+
 @app.get("/v1/operations/<opid>")
 @require_api_key
 def get_operation(opid):
+    """Fetch an operation; `?wait=<seconds>` long-polls for the next change.
+
+    With `wait`, the request returns as soon as the operation changes, or
+    immediately if it is already finished or its status differs from the
+    optional `status` param (the status the client last saw). When too many
+    requests are already parked, it answers right away instead of waiting.
+    """
+    version = OPERATION_WATCHERS.version(opid)
     op = OPERATIONS.get(opid)
     if not op:
         return error_response(404, "Operation not found")
-    return jsonify({"data": op})
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return error_response(400, "wait must be a number of seconds")
+    if not math.isfinite(wait):
+        return error_response(400, "wait must be a number of seconds")
+    wait = min(max(wait, 0), LONGPOLL_MAX_SECONDS)
+    seen = request.args.get("status", op["status"])
+    if wait and op["status"] == seen and op["status"] not in TERMINAL_OPERATION_STATUSES:
+        try:
+            OPERATION_WATCHERS.wait(opid, version, wait)
+        except TooManyWaiters:
+            pass
+    etag = VERSIONS.etag("operations", opid)
+    return not_modified(etag) or with_etag(
+        json_response(record_body("operations", OPERATIONS[opid])), etag
+    )
+
+
+@app.get("/v1/operations/<opid>/watch")
+@require_api_key
+def watch_operation(opid):
+    """Stream an operation's state as Server-Sent Events until it finishes.
+
+    Waiting between changes counts against LONGPOLL_MAX_WAITERS; when the
+    cap is reached the stream sends the current state and closes.
+    """
+    if opid not in OPERATIONS:
+        return error_response(404, "Operation not found")
+
+    def generate():
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        yield sse_retry(1000)
+        sent = None
+        while True:
+            version = OPERATION_WATCHERS.version(opid)
+            if version != sent:
+                op = OPERATIONS[opid]
+                data = RECORD_JSON.encode("operations", op).decode()
+                yield sse_frame(data, event="operation", event_id=version)
+                sent = version
+                if op["status"] in TERMINAL_OPERATION_STATUSES:
+                    return
+            if time.monotonic() >= deadline:
+                return
+            try:
+                changed = OPERATION_WATCHERS.wait(opid, version, SSE_HEARTBEAT_SECONDS)
+            except TooManyWaiters:
+                # Every waiter slot is taken. The current state went out
+                # above, so end the stream and free this thread; the client
+                # reconnects after the retry delay.
+                return
+            if not changed:
+                yield sse_comment("keepalive")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ----------------------------------------------------------------------
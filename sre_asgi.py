@@ -0,0 +1,419 @@
+"""ASGI entry point for the SRE API, alongside the WSGI ``sre_api:app``.
+
+    uvicorn sre_asgi:app --port 8080
+    gunicorn -k uvicorn.workers.UvicornWorker sre_asgi:app
+
+The long-lived endpoints are served natively on the event loop, so a parked
+client costs a coroutine rather than one of the server's threads:
+
+* ``GET /v1/operations/<id>?wait=...``  (long-poll)
+* ``GET /v1/operations/<id>/watch``     (Server-Sent Events)
+* ``GET /v1/services/<id>/logs/stream`` (Server-Sent Events)
+
+Every other request, and any of those that fails auth or validation, is
+handed to the Flask app on a bounded thread pool. Routes, ``require_api_key``,
+``error_response`` and the request-ID / compression / metrics middleware are
+therefore the same code under both servers. Operations run as callbacks on
+the loop (``AsyncOperationExecutor``) instead of on executor threads.
+"""
+import asyncio
+import io
+import math
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+import sre_api
+from operations import AsyncOperationExecutor
+from sre_api import (
+    API_KEY, LOGS, LONGPOLL_MAX_SECONDS, METRICS, OPERATION_WATCHERS, OPERATIONS, RECORD_JSON,
+    SERVICES, SSE_HEARTBEAT_SECONDS, SSE_MAX_SECONDS, STORE, TERMINAL_OPERATION_STATUSES,
+)
+from sse import sse_comment, sse_frame, sse_retry
+
+
+# Threads for requests handed to Flask; long-lived requests never take one.
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 32))
+_POOL = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+# Operations wait out their delays on the serving loop, bound on the first
+# request (or at lifespan startup), and run their steps (store writes) on
+# their own threads; Flask handlers submit to it from pool threads.
+EXECUTOR = sre_api.EXECUTOR = AsyncOperationExecutor(
+    workers=sre_api.EXECUTOR.workers, capacity=sre_api.EXECUTOR.capacity,
+)
+
+_DONE = object()
+
+
+class Request:
+    """The parts of an HTTP scope the native handlers look at."""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.body = body
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.started = time.perf_counter()
+        self.headers = {}
+        for name, value in scope["headers"]:
+            name, value = name.decode("latin-1").lower(), value.decode("latin-1")
+            self.headers[name] = f"{self.headers[name]},{value}" if name in self.headers else value
+        self.args = {}
+        for name, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"),
+                                     keep_blank_values=True):
+            self.args.setdefault(name, value)
+        self.request_id = self.headers.get("x-request-id") or str(uuid.uuid4())
+
+    def authorized(self):
+        return self.headers.get("x-api-key") == API_KEY
+
+    def without_arg(self, name):
+        """This request's scope with query parameter ``name`` removed."""
+        query = [(k, v) for k, v in parse_qsl(self.scope.get("query_string", b"").decode("latin-1"),
+                                               keep_blank_values=True) if k != name]
+        return {**self.scope, "query_string": urlencode(query).encode("latin-1")}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    _bind(asyncio.get_running_loop())
+    body = await _read_body(receive)
+    if body is None:
+        return  # client went away before sending the request
+    request = Request(scope, body)
+    if request.method == "GET":
+        for pattern, handler in _NATIVE:
+            match = pattern.match(request.path)
+            if match:
+                scope = await handler(request, match.group(1), receive, send)
+                if scope is None:
+                    return
+                break
+    await _call_flask(scope, body, send)
+
+
+# ----------------------------------------------------------------------
+#  Native (event-loop) handlers
+# ----------------------------------------------------------------------
+# Each returns None once it has answered, or a scope for Flask to answer
+# instead (auth and validation errors, or the final long-poll response).
+async def get_operation(request, opid, receive, send):
+    """Park a long-poll on the loop, then let Flask render the operation."""
+    if not request.authorized():
+        return request.scope
+    await _sync_store()
+    version = OPERATION_WATCHERS.version(opid)
+    op = OPERATIONS.get(opid)
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return request.scope
+    if not op or not wait or not math.isfinite(wait):
+        return request.scope
+    wait = min(max(wait, 0), LONGPOLL_MAX_SECONDS)
+    if not wait:
+        return request.scope
+    seen = request.args.get("status", op["status"])
+    if op["status"] == seen and op["status"] not in TERMINAL_OPERATION_STATUSES:
+        changed = asyncio.ensure_future(_changed(opid, version, wait))
+        if not await _until_disconnect(changed, receive):
+            return None
+    return request.without_arg("wait")
+
+
+async def watch_operation(request, opid, receive, send):
+    """Stream an operation's state as Server-Sent Events until it finishes."""
+    if not request.authorized():
+        return request.scope
+    await _sync_store()
+    if opid not in OPERATIONS:
+        return request.scope
+    loop = asyncio.get_running_loop()
+
+    async def events():
+        deadline = loop.time() + SSE_MAX_SECONDS
+        yield sse_retry(1000)
+        sent = None
+        while True:
+            version = OPERATION_WATCHERS.version(opid)
+            if version != sent:
+                op = OPERATIONS[opid]
+                data = RECORD_JSON.encode("operations", op).decode()
+                yield sse_frame(data, event="operation", event_id=version)
+                sent = version
+                if op["status"] in TERMINAL_OPERATION_STATUSES:
+                    return
+            if loop.time() >= deadline:
+                return
+            if not await _changed(opid, version, SSE_HEARTBEAT_SECONDS):
+                yield sse_comment("keepalive")
+
+    await _stream(request, "/v1/operations/<opid>/watch", events(), receive, send)
+    return None
+
+
+async def stream_service_logs(request, sid, receive, send):
+    """Follow a service's logs as Server-Sent Events (see the Flask view)."""
+    if not request.authorized():
+        return request.scope
+    await _sync_store()
+    if sid not in SERVICES:
+        return request.scope
+    resume = request.headers.get("last-event-id") or request.args.get("last_event_id")
+    try:
+        tail = max(int(request.args.get("tail", 0)), 0)
+        resume = int(resume) + 1 if resume else None
+    except ValueError:
+        return request.scope
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    async def events():
+        sub, end = LOGS.subscribe(sid, notify=lambda: loop.call_soon_threadsafe(wake.set))
+        position = resume if resume is not None else end - tail
+        deadline = loop.time() + SSE_MAX_SECONDS
+        try:
+            yield sse_retry(1000)
+            # Backlog from the buffer; anything newer arrives via `sub`.
+            for seq, line in LOGS.entries(sid, position, end):
+                yield sse_frame(line, event="log", event_id=seq)
+                position = seq + 1
+            position = max(position, end)
+            while loop.time() < deadline:
+                try:
+                    event = sub.queue.get_nowait()
+                except queue.Empty:
+                    wake.clear()
+                    if sub.queue.empty():
+                        try:
+                            await asyncio.wait_for(wake.wait(), SSE_HEARTBEAT_SECONDS)
+                        except asyncio.TimeoutError:
+                            yield sse_comment("keepalive")
+                    continue
+                if sub.overflowed:
+                    # We fell behind the inbox; re-read the gap from the buffer.
+                    sub.overflowed = False
+                    _, newest = LOGS.bounds(sid)
+                    for seq, line in LOGS.entries(sid, position, newest):
+                        yield sse_frame(line, event="log", event_id=seq)
+                    position = max(position, newest)
+                if event.seq >= position:
+                    yield event.frame
+                    position = event.seq + 1
+        finally:
+            LOGS.unsubscribe(sid, sub)
+
+    await _stream(request, "/v1/services/<sid>/logs/stream", events(), receive, send)
+    return None
+
+
+_NATIVE = (
+    (re.compile(r"^/v1/operations/([^/]+)$"), get_operation),
+    (re.compile(r"^/v1/operations/([^/]+)/watch$"), watch_operation),
+    (re.compile(r"^/v1/services/([^/]+)/logs/stream$"), stream_service_logs),
+)
+
+
+async def _changed(opid, version, timeout):
+    """Wait until ``opid`` moves past ``version``; False on timeout."""
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def wake():
+        loop.call_soon_threadsafe(changed.set)
+
+    OPERATION_WATCHERS.add_listener(opid, wake)
+    try:
+        if OPERATION_WATCHERS.version(opid) != version:
+            return True
+        await asyncio.wait_for(changed.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        OPERATION_WATCHERS.remove_listener(opid, wake)
+
+
+async def _sync_store():
+    """What the Flask `sync_store` hook does, off the loop (it queries the database)."""
+    if STORE.backend.shared:
+        await asyncio.get_running_loop().run_in_executor(_POOL, STORE.sync)
+
+
+async def _stream(request, route, chunks, receive, send):
+    """Send the async iterable ``chunks`` as an event stream until it ends or the client leaves."""
+    headers = [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+        (b"x-request-id", request.request_id.encode("latin-1")),
+        (b"content-security-policy", b"frame-ancestors *"),
+        (b"access-control-allow-origin", b"*"),
+    ]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    _record(request, route, 200)
+
+    async def pump():
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    try:
+        await _until_disconnect(asyncio.ensure_future(pump()), receive)
+    finally:
+        await chunks.aclose()
+
+
+async def _until_disconnect(task, receive):
+    """Await ``task`` unless the client disconnects first (then cancel it).
+
+    Returns True if the task finished, False if the client went away.
+    """
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for pending in (task, watcher):
+            if not pending.done():
+                pending.cancel()
+        await asyncio.wait((task, watcher))
+    if task.cancelled():
+        return False
+    task.result()  # re-raise its error, if any
+    return True
+
+
+def _record(request, route, status):
+    labels = (("method", request.method), ("route", route))
+    METRICS.inc("http_requests_total", labels + (("status", str(status)),))
+    METRICS.observe("http_request_duration_seconds", labels, time.perf_counter() - request.started)
+
+
+# ----------------------------------------------------------------------
+#  Flask bridge
+# ----------------------------------------------------------------------
+async def _call_flask(scope, body, send):
+    """Run the WSGI app on the pool and relay its response chunk by chunk."""
+    loop = asyncio.get_running_loop()
+    status, headers, result, chunks, buffered = await loop.run_in_executor(
+        _POOL, _start_wsgi, _environ(scope, body)
+    )
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers],
+        })
+        for chunk in buffered:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        while chunks is not None:
+            chunk = await loop.run_in_executor(_POOL, next, chunks, _DONE)
+            if chunk is _DONE:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        if hasattr(result, "close"):
+            await loop.run_in_executor(_POOL, result.close)
+
+
+def _start_wsgi(environ):
+    """Call the app and read up to two chunks, which covers unstreamed bodies.
+
+    Returns ``(status, headers, result, chunks, buffered)``; ``chunks`` is
+    None when the body is already complete.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = sre_api.app(environ, start_response)
+    chunks = iter(result)
+    buffered = []
+    for _ in range(2):
+        chunk = next(chunks, _DONE)
+        if chunk is _DONE:
+            chunks = None
+            break
+        buffered.append(chunk)
+    status, headers = started
+    return status, headers, result, chunks, buffered
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", None)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": "",
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is already read in full (it may have arrived chunked).
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+# ----------------------------------------------------------------------
+#  Plumbing
+# ----------------------------------------------------------------------
+def _bind(loop):
+    if EXECUTOR.loop is None:
+        EXECUTOR.bind(loop)
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _bind(asyncio.get_running_loop())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,21 @@
+def sse_frame(data, event=None, event_id=None):
+    """Encode one Server-Sent Events frame as bytes."""
+    parts = []
+    if event_id is not None:
+        parts.append(f"id: {event_id}\n")
+    if event is not None:
+        parts.append(f"event: {event}\n")
+    for line in str(data).split("\n"):
+        parts.append(f"data: {line}\n")
+    parts.append("\n")
+    return "".join(parts).encode()
+
+
+def sse_comment(text=""):
+    """A comment frame; clients ignore it, proxies see traffic (heartbeats)."""
+    return f": {text}\n\n".encode()
+
+
+def sse_retry(milliseconds):
+    """Tell EventSource clients how long to wait before reconnecting."""
+    return f"retry: {int(milliseconds)}\n\n".encode()
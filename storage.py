@@ -0,0 +1,663 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+
+log = logging.getLogger(__name__)
+
+
+# Record collections held by the Store (``workers`` holds the heartbeats of
+# processes sharing a backend); log lines travel on the same change feed
+# under LOG_COLLECTION but live in the LogStore.
+COLLECTIONS = ("services", "incidents", "operations", "workers")
+LOG_COLLECTION = "logs"
+
+# Change operations. A change is a ``(seq, collection, key, op, value)`` tuple:
+#   put     value is the full record
+#   patch   value is a dict of fields to merge into the current record
+#   delete  value is None
+#   append  value is a log row ``[ts, level, name, message]``, optionally
+#           followed by the line's per-service sequence number
+PUT, PATCH, DELETE, APPEND = "put", "patch", "delete", "append"
+
+
+class Conflict(Exception):
+    """Raised when a guarded write finds the record not in the expected state.
+
+    ``current`` is the record as it was found (``None`` if it doesn't exist).
+    """
+
+    def __init__(self, current):
+        super().__init__("record is not in the expected state")
+        self.current = current
+
+
+def satisfies(record, expect):
+    """True if ``record`` exists and each ``expect`` field holds an allowed value."""
+    return record is not None and all(record.get(field) in allowed
+                                      for field, allowed in expect.items())
+
+
+class MemoryBackend:
+    """Single-process backend: the change feed is an in-memory queue.
+
+    Nothing is shared or persisted; this is the original behaviour and the
+    default.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._seq = 0
+
+    def bootstrap(self, seed):
+        self.write_many(seed())
+
+    def set_state_source(self, source):
+        """Backends that snapshot state call ``source()``; this one doesn't."""
+
+    def write_many(self, changes, expect=None):
+        # ``expect`` is checked by the Store, which holds the only copy of
+        # the state and serializes writes against it.
+        with self._lock:
+            self._enqueue(changes)
+            return self._seq
+
+    def _enqueue(self, changes):
+        entries = []
+        for collection, key, op, value in changes:
+            self._seq += 1
+            entries.append((self._seq, collection, key, op, value))
+        self._pending.extend(entries)
+        return entries
+
+    def changes_since(self, seq):
+        with self._lock:
+            changes = list(self._pending)
+            self._pending.clear()
+        return changes
+
+    def snapshot(self):
+        return [], 0
+
+
+class SqliteBackend:
+    """Multi-process backend on one SQLite database in WAL mode.
+
+    Every write is appended to a ``changes`` table (the feed other processes
+    tail) and folded into a ``records`` table holding the latest state, in the
+    same transaction. New processes load ``records`` plus the retained log
+    lines, then follow the feed.
+
+    Old feed entries are trimmed: record changes beyond ``retention`` (a
+    process that falls further behind reloads from ``records``) and log
+    lines beyond ``log_max_lines`` per service.
+    """
+
+    shared = True
+
+    def __init__(self, path, retention=100000, log_max_lines=10000):
+        self.path = path
+        self.retention = retention
+        self.log_max_lines = log_max_lines
+        self._local = threading.local()
+        self._writes = 0
+        self._log_writes = {}
+        self.epoch = self._initialize()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork (e.g. gunicorn --preload).
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _initialize(self):
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS records (
+                collection TEXT, id TEXT, body TEXT, seq INTEGER,
+                PRIMARY KEY (collection, id)
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection TEXT, id TEXT, op TEXT, body TEXT
+            );
+            CREATE INDEX IF NOT EXISTS changes_by_key ON changes (collection, id, seq);
+            CREATE TABLE IF NOT EXISTS log_seq (id TEXT PRIMARY KEY, next INTEGER);
+            """
+        )
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('trimmed_through', '0')")
+            epoch = conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return epoch
+
+    def bootstrap(self, seed):
+        """Write ``seed()`` once per database, whichever process gets here first."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone() is None:
+                self._write(conn, seed())
+                conn.execute("INSERT INTO meta VALUES ('seeded', '1')")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def write_many(self, changes, expect=None):
+        """Apply ``changes`` in one transaction.
+
+        ``expect`` (``{field: allowed values}``) guards every patched record:
+        it is checked inside the transaction, so other processes can't slip
+        a write in between, and ``Conflict`` aborts the whole batch.
+        """
+        changes = list(changes)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = self._write(conn, changes, expect)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_trim(changes)
+        return seq
+
+    def _write(self, conn, changes, expect=None):
+        seq = 0
+        for collection, key, op, value in changes:
+            if op == APPEND:
+                # Number each service's lines here so every process agrees.
+                (line_seq,) = conn.execute(
+                    "INSERT INTO log_seq VALUES (?, 1) ON CONFLICT (id) DO UPDATE "
+                    "SET next = next + 1 RETURNING next - 1", (key,)
+                ).fetchone()
+                value = list(value[:4]) + [line_seq]
+            body = None if value is None else json.dumps(value)
+            if op == PATCH:
+                row = conn.execute(
+                    "SELECT body FROM records WHERE collection = ? AND id = ?", (collection, key)
+                ).fetchone()
+                current = None if row is None else json.loads(row[0])
+                if expect and not satisfies(current, expect):
+                    raise Conflict(current)
+                if current is None:
+                    continue
+                merged = json.dumps({**current, **value})
+            seq = conn.execute(
+                "INSERT INTO changes (collection, id, op, body) VALUES (?, ?, ?, ?)",
+                (collection, key, op, body),
+            ).lastrowid
+            if op == PUT:
+                conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                             (collection, key, body, seq))
+            elif op == PATCH:
+                conn.execute("UPDATE records SET body = ?, seq = ? WHERE collection = ? AND id = ?",
+                             (merged, seq, collection, key))
+            elif op == DELETE:
+                conn.execute("DELETE FROM records WHERE collection = ? AND id = ?", (collection, key))
+        return seq
+
+    def _maybe_trim(self, changes):
+        """Bound the feed; runs in the writer's thread every so many writes."""
+        conn = self._conn()
+        self._writes += len(changes)
+        if self._writes >= 1000:
+            self._writes = 0
+            (newest,) = conn.execute("SELECT coalesce(max(seq), 0) FROM changes").fetchone()
+            cutoff = newest - self.retention
+            if cutoff > 0:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM changes WHERE seq <= ? AND collection != ?",
+                             (cutoff, LOG_COLLECTION))
+                conn.execute("UPDATE meta SET value = max(CAST(value AS INTEGER), ?) "
+                             "WHERE key = 'trimmed_through'", (cutoff,))
+                conn.execute("COMMIT")
+        for collection, key, op, _ in changes:
+            if op != APPEND:
+                continue
+            count = self._log_writes.get(key, 0) + 1
+            if count < max(self.log_max_lines // 8, 1):
+                self._log_writes[key] = count
+                continue
+            self._log_writes[key] = 0
+            conn.execute(
+                "DELETE FROM changes WHERE collection = ? AND id = ? AND seq < ("
+                "  SELECT seq FROM changes WHERE collection = ? AND id = ?"
+                "  ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (LOG_COLLECTION, key, LOG_COLLECTION, key, self.log_max_lines - 1),
+            )
+
+    def set_state_source(self, source):
+        """SQLite is its own durable state; nothing to snapshot."""
+
+    def changes_since(self, seq, limit=5000):
+        """Feed entries after ``seq``, or None if they were already trimmed."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            (trimmed,) = conn.execute(
+                "SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'trimmed_through'"
+            ).fetchone()
+            if seq < trimmed:
+                return None
+            rows = conn.execute(
+                "SELECT seq, collection, id, op, body FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return [(s, c, k, op, None if body is None else json.loads(body))
+                for s, c, k, op, body in rows]
+
+    def snapshot(self):
+        """``(changes, seq)``: puts for every record plus retained log appends."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            (seq,) = conn.execute("SELECT coalesce(max(seq), 0) FROM changes").fetchone()
+            records = conn.execute("SELECT seq, collection, id, body FROM records").fetchall()
+            logs = conn.execute(
+                "SELECT seq, id, body FROM changes WHERE collection = ? ORDER BY seq",
+                (LOG_COLLECTION,),
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        changes = [(s, c, k, PUT, json.loads(body)) for s, c, k, body in records]
+        changes += [(s, LOG_COLLECTION, k, APPEND, json.loads(body)) for s, k, body in logs]
+        return changes, seq
+
+
+class JournalBackend(MemoryBackend):
+    """Single-process backend made durable by a journal plus snapshots.
+
+    Every change is appended to ``journal.log`` as one JSON line. A background
+    thread fsyncs it every ``fsync_interval`` seconds (0 means fsync on each
+    write, in the writer's thread). Every ``snapshot_every`` changes it also
+    pickles the full state (from ``set_state_source``) to ``snapshot.pkl``
+    and starts a fresh journal. Startup loads the latest snapshot and
+    replays only the journal written since, so warm-start time depends on
+    the size of the state, not the length of its history.
+    """
+
+    def __init__(self, directory, fsync_interval=1.0, snapshot_every=10000):
+        super().__init__()
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        self._journal_path = os.path.join(directory, "journal.log")
+        self._rotated_path = os.path.join(directory, "journal.old")
+        self._snapshot_path = os.path.join(directory, "snapshot.pkl")
+        self._journal = None
+        self._opened = threading.Event()  # set once bootstrap has opened the journal
+        self._dirty = False
+        self._since_snapshot = 0
+        self._source = None
+        self._flusher = None
+
+    def set_state_source(self, source):
+        """``source()`` must return ``(seq, changes)`` describing the full state."""
+        self._source = source
+
+    def bootstrap(self, seed):
+        with self._lock:
+            entries = self._load()
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+            self._opened.set()
+            if entries:
+                self._pending.extend(entries)
+                self._seq = max(self._seq, entries[-1][0])
+            else:
+                log.info("no snapshot or journal in %s, seeding", self.directory)
+        if not entries:
+            self.write_many(seed())
+        if self.fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="journal-flush", daemon=True)
+            self._flusher.start()
+
+    def write_many(self, changes, expect=None):
+        # Writes that arrive while bootstrap is still loading (SEED_LAZY)
+        # wait for it, so they land after the restored state, in the journal.
+        self._opened.wait()
+        with self._lock:
+            entries = self._enqueue(changes)
+            self._journal.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            self._since_snapshot += len(entries)
+            self._dirty = True
+            if self.fsync_interval <= 0:
+                self._fsync()
+            return self._seq
+
+    # ------------------------------------------------------------------
+    #  Loading
+    # ------------------------------------------------------------------
+    def _load(self):
+        """Snapshot entries followed by journal entries newer than it."""
+        started = time.monotonic()
+        entries, seq = [], 0
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, "rb") as fh:
+                snapshot = pickle.load(fh)
+            seq = snapshot["seq"]
+            entries.extend(snapshot["changes"])
+        replayed = 0
+        # journal.old only survives a crash between rotation and snapshot.
+        for path in (self._rotated_path, self._journal_path):
+            for entry in self._read_journal(path):
+                if entry[0] > seq:
+                    entries.append(entry)
+                    seq = entry[0]
+                    replayed += 1
+        if entries:
+            log.info("loaded %d snapshot entries and replayed %d journal entries in %.2fs",
+                     len(entries) - replayed, replayed, time.monotonic() - started)
+        return entries
+
+    @staticmethod
+    def _read_journal(path):
+        if not os.path.exists(path):
+            return []
+        entries, good = [], 0
+        with open(path, "r+", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entries.append(tuple(json.loads(line)))
+                except ValueError:
+                    break  # torn final write from a crash; drop it
+                good += len(line.encode("utf-8"))
+            fh.truncate(good)
+        return entries
+
+    # ------------------------------------------------------------------
+    #  Background fsync and snapshots
+    # ------------------------------------------------------------------
+    def _fsync(self):
+        if self._dirty:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            fd = None
+            with self._lock:
+                if self._dirty:
+                    # Only the buffer flush needs the lock; the fsync goes
+                    # through a duplicate descriptor so writers don't wait on
+                    # the disk, and a rotation meanwhile can't close it.
+                    self._journal.flush()
+                    fd = os.dup(self._journal.fileno())
+                    self._dirty = False
+                due = self._since_snapshot >= self.snapshot_every and self._source is not None
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            if due:
+                self.snapshot_now()
+
+    def snapshot_now(self):
+        """Write a snapshot and drop the journal it supersedes."""
+        with self._lock:
+            # Everything up to here goes to journal.old; newer writes to a
+            # fresh journal. The state captured below is at least this new.
+            self._fsync()
+            self._journal.close()
+            if os.path.exists(self._rotated_path):
+                # A previous snapshot never finished; keep its journal too.
+                with open(self._rotated_path, "a", encoding="utf-8") as old, \
+                        open(self._journal_path, encoding="utf-8") as current:
+                    old.write(current.read())
+                os.remove(self._journal_path)
+            else:
+                os.replace(self._journal_path, self._rotated_path)
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+            self._since_snapshot = 0
+        seq, changes = self._source()
+        tmp = self._snapshot_path + ".tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump({"seq": seq, "changes": changes}, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._snapshot_path)
+        os.remove(self._rotated_path)
+
+
+class Store:
+    """Owns the record collections and funnels every change through a backend.
+
+    Writes never touch the dicts directly: they go to the backend's change
+    feed and are then applied from it, in feed order, by ``sync``. With a
+    shared backend, each process applies every other process's writes the
+    same way, so all of them converge on the same state. Listeners see each
+    applied change as ``(collection, key, old, new, seq)``, which is how
+    indexes, versions and caches stay in step no matter which process wrote.
+
+    Records are never mutated once applied: a patch builds a new record and
+    swaps it in, so a reader holding a record (or a ``view``) always sees one
+    consistent version of it without taking any lock. ``record_types`` maps
+    a collection to the type its records are built as (default ``dict``;
+    see records.py).
+    """
+
+    def __init__(self, backend, record_types=None):
+        self.backend = backend
+        self.record_types = record_types or {}
+        self.collections = {name: {} for name in COLLECTIONS}
+        self.seq = 0
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._views = {}  # collection -> tuple of records, rebuilt after changes
+        self._sync_thread = None
+
+    @property
+    def epoch(self):
+        return self.backend.epoch
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    # ------------------------------------------------------------------
+    #  Writes
+    # ------------------------------------------------------------------
+    def put(self, collection, record):
+        self.write([(collection, record["id"], PUT, record)])
+        return self.collections[collection].get(record["id"])
+
+    def update(self, collection, key, expect=None, **changes):
+        """Merge ``changes`` into a record and return the new version.
+
+        With ``expect`` (``{field: allowed values}``) the update is a
+        compare-and-set: it raises ``Conflict`` instead of writing unless the
+        record currently satisfies ``expect``.
+        """
+        with self._lock:
+            if expect:
+                self.sync()
+                current = self.collections[collection].get(key)
+                if not satisfies(current, expect):
+                    raise Conflict(current)
+            self.write([(collection, key, PATCH, changes)], expect=expect)
+            return self.collections[collection].get(key)
+
+    def delete(self, collection, key):
+        self.write([(collection, key, DELETE, None)])
+
+    def append_log(self, sid, row):
+        self.write([(LOG_COLLECTION, sid, APPEND, row)])
+
+    def write(self, changes, expect=None):
+        # Holding the apply lock across the write keeps check-then-write in
+        # ``update`` atomic against every other writer in this process.
+        with self._lock:
+            self.backend.write_many(changes, expect=expect)
+            self.sync()
+
+    # ------------------------------------------------------------------
+    #  Reads
+    # ------------------------------------------------------------------
+    def view(self, collection):
+        """An immutable snapshot (tuple) of every record in ``collection``.
+
+        Safe to iterate while writers run. It is rebuilt at most once per
+        change to the collection, so repeated reads between writes share it.
+        """
+        view = self._views.get(collection)
+        if view is None:
+            with self._lock:
+                view = self._views.get(collection)
+                if view is None:
+                    view = self._views[collection] = tuple(self.collections[collection].values())
+        return view
+
+    # ------------------------------------------------------------------
+    #  Applying the feed
+    # ------------------------------------------------------------------
+    def bootstrap(self, seed):
+        """Seed an empty backend (once), then load whatever it holds."""
+        self.backend.bootstrap(seed)
+        with self._lock:
+            changes, seq = self.backend.snapshot()
+            for change in changes:
+                self._apply(change)
+            self.seq = max(self.seq, seq)
+        self.sync()
+
+    def sync(self):
+        """Apply every feed entry this process has not seen yet."""
+        if self.backend.shared:
+            self._sync_shared()
+            return
+        with self._lock:
+            self._apply_all(self.backend.changes_since(self.seq))
+
+    def _sync_shared(self):
+        # The feed query runs outside the apply lock so writers (which hold
+        # it) don't queue behind it; entries another thread applied in the
+        # meantime are skipped by seq.
+        while True:
+            changes = self.backend.changes_since(self.seq)
+            if not changes and changes is not None:
+                return
+            with self._lock:
+                if changes is None:
+                    self._reload()
+                    continue
+                self._apply_all(change for change in changes if change[0] > self.seq)
+
+    def _apply_all(self, changes):
+        for change in changes:
+            self._apply(change)
+
+    def _reload(self):
+        """Fell behind the trimmed feed: resync records from the backend."""
+        changes, seq = self.backend.snapshot()
+        seen = set()
+        for change in changes:
+            _, collection, key, op, _ = change
+            if op == APPEND and change[0] <= self.seq:
+                continue
+            seen.add((collection, key))
+            self._apply(change)
+        for collection, records in self.collections.items():
+            for key in [k for k in records if (collection, k) not in seen]:
+                self._apply((seq, collection, key, DELETE, None))
+        self.seq = seq
+
+    def _apply(self, change):
+        seq, collection, key, op, value = change
+        self.seq = max(self.seq, seq)
+        if collection == LOG_COLLECTION:
+            old, new = None, value
+        else:
+            records = self.collections[collection]
+            old = records.get(key)
+            make = self.record_types.get(collection, dict)
+            if op == PUT:
+                new = make(value)
+            elif op == PATCH:
+                if old is None:
+                    return
+                new = make({**old, **value})
+            else:
+                new = None
+            if new is None:
+                records.pop(key, None)
+            else:
+                records[key] = new
+            self._views.pop(collection, None)
+        for listener in self._listeners:
+            listener(collection, key, old, new, seq)
+
+    def start_sync(self, interval=0.05):
+        """Follow other processes' writes in the background (shared backends only)."""
+        if not self.backend.shared or self._sync_thread is not None:
+            return
+        self._sync_thread = threading.Thread(
+            target=self._sync_loop, args=(interval,), name="store-sync", daemon=True
+        )
+        self._sync_thread.start()
+
+    def capture(self, export_logs):
+        """``(seq, changes)`` recreating the current state, for snapshots.
+
+        ``export_logs()`` supplies retained log rows as ``{sid: [row, ...]}``.
+        Taken under the apply lock so records, logs and ``seq`` agree.
+        """
+        with self._lock:
+            self.sync()
+            seq = self.seq
+            changes = [(seq, collection, key, PUT, dict(record))
+                       for collection, records in self.collections.items()
+                       for key, record in records.items()]
+            logs = export_logs()
+        changes += [(seq, LOG_COLLECTION, sid, APPEND, row)
+                    for sid, rows in logs.items() for row in rows]
+        return seq, changes
+
+    def _sync_loop(self, interval):
+        stop = threading.Event()
+        while not stop.wait(interval):
+            try:
+                self.sync()
+            except sqlite3.Error:
+                log.exception("store sync failed")
+
+
+def make_backend(kind=None, path=None, log_max_lines=10000,
+                 fsync_interval=1.0, snapshot_every=10000):
+    """Build the backend named by ``kind`` (``memory``, ``journal`` or ``sqlite``)."""
+    kind = kind or "memory"
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "journal":
+        return JournalBackend(path or "sre-api-data", fsync_interval=fsync_interval,
+                              snapshot_every=snapshot_every)
+    if kind == "sqlite":
+        return SqliteBackend(path or "sre-api.db", log_max_lines=log_max_lines)
+    raise ValueError(f"unknown store backend: {kind}")
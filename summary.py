@@ -0,0 +1,46 @@
+import threading
+
+
+class SummaryCounters:
+    """Record counts per collection, broken down by derived values.
+
+    ``breakdowns`` maps a collection to ``{name: fn(record) -> value}``;
+    a value of ``None`` leaves the record out of that breakdown. Counters
+    are adjusted from each change's old and new record, so reading them is
+    O(1) in the number of records.
+    """
+
+    def __init__(self, breakdowns):
+        self.breakdowns = breakdowns
+        self._lock = threading.Lock()
+        self._totals = {collection: 0 for collection in breakdowns}
+        self._counts = {collection: {name: {} for name in names}
+                        for collection, names in breakdowns.items()}
+
+    def apply(self, collection, old, new):
+        names = self.breakdowns.get(collection)
+        if names is None:
+            return
+        with self._lock:
+            counts = self._counts[collection]
+            for record, delta in ((old, -1), (new, 1)):
+                if record is None:
+                    continue
+                self._totals[collection] += delta
+                for name, fn in names.items():
+                    value = fn(record)
+                    if value is None:
+                        continue
+                    bucket = counts[name]
+                    bucket[value] = bucket.get(value, 0) + delta
+                    if not bucket[value]:
+                        del bucket[value]
+
+    def snapshot(self):
+        """``{collection: {"total": n, <name>: {value: n}}}``, consistent across collections."""
+        with self._lock:
+            return {
+                collection: {"total": self._totals[collection],
+                             **{name: dict(bucket) for name, bucket in counts.items()}}
+                for collection, counts in self._counts.items()
+            }
@@ -0,0 +1,57 @@
+import threading
+import uuid
+
+
+class Versions:
+    """Monotonic change counters for collections and individual records.
+
+    All counters share one clock, so every mutation gets a unique version and
+    a collection's version is simply the clock value of its latest change.
+    Readers use these to build strong ETags without touching the data.
+
+    ``epoch`` is unique per store instance, so versions from a previous
+    process (which restart at zero) never produce a matching ETag.
+    """
+
+    def __init__(self, epoch=None):
+        self.epoch = epoch or uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._clock = 0
+        self._collections = {}
+        self._records = {}
+        self._listeners = []
+
+    def bump(self, collection, key=None, version=None):
+        """Record a change to ``collection`` (and record ``key``, if given).
+
+        ``version`` lets a shared store supply its own sequence number so
+        every process derives the same ETags; otherwise the local clock ticks.
+        """
+        with self._lock:
+            if version is None:
+                self._clock += 1
+                version = self._clock
+            else:
+                self._clock = max(self._clock, version)
+            self._collections[collection] = max(self._collections.get(collection, 0), version)
+            if key is not None:
+                self._records[(collection, key)] = version
+        for listener in self._listeners:
+            listener(collection, version)
+        return version
+
+    def subscribe(self, listener):
+        """Call ``listener(collection, version)`` after every bump."""
+        self._listeners.append(listener)
+
+    def get(self, collection, key=None):
+        if key is None:
+            return self._collections.get(collection, 0)
+        return self._records.get((collection, key), 0)
+
+    def etag(self, collection, key=None, version=None):
+        """Strong ETag value for a collection or record at its current version."""
+        if version is None:
+            version = self.get(collection, key)
+        name = collection if key is None else f"{collection}/{key}"
+        return f"{name}.{self.epoch}.{version}"
@@ -0,0 +1,75 @@
+import threading
+
+
+class TooManyWaiters(Exception):
+    """Raised when a new waiter would exceed ``WatchRegistry.max_waiters``."""
+
+
+class WatchRegistry:
+    """Change notifications keyed by record id.
+
+    Writers call ``notify(key)`` after mutating a record. Blocking waiters
+    park on a private ``threading.Event`` registered under that key, so a
+    change only wakes the requests watching that record. Non-blocking
+    callers (e.g. an asyncio loop) can register plain callbacks instead.
+
+    ``max_waiters`` bounds how many threads may be parked at once so
+    long-polls can't starve a fixed-size thread pool.
+    """
+
+    def __init__(self, max_waiters=4):
+        self.max_waiters = max_waiters
+        self._lock = threading.Lock()
+        self._versions = {}   # key -> change counter
+        self._waiters = {}    # key -> set of Events / callbacks
+        self._blocked = 0
+
+    def version(self, key):
+        return self._versions.get(key, 0)
+
+    def notify(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            waiters = list(self._waiters.get(key, ()))
+        for waiter in waiters:
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                waiter()
+
+    def add_listener(self, key, callback):
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(callback)
+
+    def remove_listener(self, key, callback):
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.discard(callback)
+                if not waiters:
+                    del self._waiters[key]
+
+    def wait(self, key, version, timeout):
+        """Block until ``key`` moves past ``version`` or ``timeout`` elapses.
+
+        Returns True if a change happened. Raises TooManyWaiters if the
+        registry is already holding ``max_waiters`` threads.
+        """
+        event = threading.Event()
+        with self._lock:
+            if self._versions.get(key, 0) != version:
+                return True
+            if self._blocked >= self.max_waiters:
+                raise TooManyWaiters(f"{self._blocked} requests already waiting")
+            self._blocked += 1
+            self._waiters.setdefault(key, set()).add(event)
+        try:
+            return event.wait(timeout)
+        finally:
+            self.remove_listener(key, event)
+            with self._lock:
+                self._blocked -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"blocked": self._blocked, "max_waiters": self.max_waiters}